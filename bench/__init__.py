@@ -0,0 +1 @@
+# bench 包：压测与基准（桩上游 + 桩 MongoDB + 负载生成器）
@@ -0,0 +1,83 @@
+# bench/bridge_server.py - 以桩 MongoDB 启动桥接服务，并暴露进程资源统计供压测采样
+
+import argparse
+import asyncio
+import os
+import resource
+from datetime import datetime
+
+import uvicorn
+
+from bench import stub_mongo
+
+
+def _rss_bytes() -> int:
+    """当前常驻内存；优先读 /proc，其他平台退回峰值 RSS。"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="压测用桥接服务（桩 MongoDB）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--upstream", default="http://127.0.0.1:9100", help="桩上游地址")
+    parser.add_argument("--api-key", default="sk-bench-key")
+    parser.add_argument("--balance", type=int, default=10**12)
+    parser.add_argument(
+        "--storage",
+        choices=("mongo-stub", "memory", "sqlite"),
+        default="mongo-stub",
+        help="mongo-stub 走 MongoStorage + 进程内替身；其余直接使用对应后端",
+    )
+    parser.add_argument("--sqlite-path", default="bench/results/bench.db")
+    args = parser.parse_args()
+
+    # 环境变量优先于 .env，确保桥接指向桩上游
+    os.environ["LLM_ENDPOINT"] = args.upstream
+    os.environ["LLM_API_KEY"] = "stub"
+    os.environ.setdefault("LLM_MODEL", "bench-model")
+
+    if args.storage == "mongo-stub":
+        stub_mongo.install()
+        os.environ["STORAGE_BACKEND"] = "mongo"
+    else:
+        os.environ["STORAGE_BACKEND"] = args.storage
+        os.environ["SQLITE_PATH"] = args.sqlite_path
+        if args.storage == "sqlite":
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(args.sqlite_path + suffix):
+                    os.remove(args.sqlite_path + suffix)
+
+    from storage import get_storage
+
+    async def _seed() -> None:
+        storage = get_storage()
+        await storage.create_key(
+            {
+                "api_key": args.api_key,
+                "user_name": "bench",
+                "balance_tokens": args.balance,
+                "status": "active",
+                "created_at": datetime.utcnow(),
+            }
+        )
+        await storage.flush()
+
+    asyncio.run(_seed())
+
+    import main as bridge
+
+    @bridge.app.get("/__bench/stats")
+    async def bench_stats():
+        ru = resource.getrusage(resource.RUSAGE_SELF)
+        return {"cpu_s": ru.ru_utime + ru.ru_stime, "rss_bytes": _rss_bytes()}
+
+    uvicorn.run(bridge.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# bench/loadgen.py - 固定并发驱动 /v1/chat/completions（流式 / 非流式），统计延迟与资源
+
+import asyncio
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+
+@dataclass
+class PhaseResult:
+    """一轮压测的原始数据。"""
+
+    latencies_ms: list[float] = field(default_factory=list)
+    ttft_ms: list[float] = field(default_factory=list)
+    errors: int = 0
+    completion_tokens: int = 0
+    wall_s: float = 0.0
+    cpu_s: float | None = None
+    rss_idle_bytes: int | None = None
+    rss_peak_bytes: int | None = None
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    """最近秩百分位；空列表返回 None。"""
+    if not values:
+        return None
+    s = sorted(values)
+    idx = min(len(s) - 1, max(0, math.ceil(p / 100 * len(s)) - 1))
+    return s[idx]
+
+
+def _usage_tokens(obj: dict) -> int:
+    u = obj.get("usage") or {}
+    return u.get("completion_tokens") or u.get("output_tokens") or 0
+
+
+async def _one_stream(client: httpx.AsyncClient, url: str, headers: dict, body: dict, res: PhaseResult) -> None:
+    start = time.perf_counter()
+    first: float | None = None
+    tokens = 0
+    async with client.stream("POST", url, headers=headers, json=body) as resp:
+        if resp.status_code != 200:
+            await resp.aread()
+            res.errors += 1
+            return
+        async for line in resp.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = line[6:]
+            if data == "[DONE]":
+                break
+            if first is None:
+                first = time.perf_counter()
+            tokens = _usage_tokens(json.loads(data)) or tokens
+    end = time.perf_counter()
+    res.latencies_ms.append((end - start) * 1000)
+    if first is not None:
+        res.ttft_ms.append((first - start) * 1000)
+    res.completion_tokens += tokens
+
+
+async def _one_plain(client: httpx.AsyncClient, url: str, headers: dict, body: dict, res: PhaseResult) -> None:
+    start = time.perf_counter()
+    resp = await client.post(url, headers=headers, json=body)
+    if resp.status_code != 200:
+        res.errors += 1
+        return
+    res.latencies_ms.append((time.perf_counter() - start) * 1000)
+    res.completion_tokens += _usage_tokens(resp.json())
+
+
+async def _stats(client: httpx.AsyncClient, stats_url: str | None) -> dict | None:
+    if not stats_url:
+        return None
+    try:
+        return (await client.get(stats_url)).json()
+    except httpx.HTTPError:
+        return None
+
+
+async def run_phase(
+    url: str,
+    api_key: str,
+    stream: bool,
+    concurrency: int,
+    total_requests: int,
+    messages: list[dict[str, Any]],
+    stats_url: str | None = None,
+    sample_interval_s: float = 0.05,
+) -> PhaseResult:
+    """
+    以固定并发发送 total_requests 个请求。
+    stats_url 指向桥接的 /__bench/stats 时，额外采集 CPU 耗时与 RSS 峰值（直连基线不传）。
+    """
+    res = PhaseResult()
+    headers = {"Authorization": f"Bearer {api_key}"}
+    body = {"model": "bench-model", "messages": messages, "stream": stream}
+    if stream:
+        body["stream_options"] = {"include_usage": True}
+    one = _one_stream if stream else _one_plain
+    limits = httpx.Limits(max_connections=concurrency + 2, max_keepalive_connections=concurrency + 2)
+    remaining = total_requests
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0), limits=limits) as client:
+        before = await _stats(client, stats_url)
+        if before:
+            res.rss_idle_bytes = res.rss_peak_bytes = before["rss_bytes"]
+        done = asyncio.Event()
+
+        async def _sampler() -> None:
+            while not done.is_set():
+                s = await _stats(client, stats_url)
+                if s:
+                    res.rss_peak_bytes = max(res.rss_peak_bytes or 0, s["rss_bytes"])
+                await asyncio.sleep(sample_interval_s)
+
+        async def _worker() -> None:
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                try:
+                    await one(client, url, headers, body, res)
+                except httpx.HTTPError:
+                    res.errors += 1
+
+        sampler = asyncio.create_task(_sampler()) if stats_url else None
+        t0 = time.perf_counter()
+        await asyncio.gather(*(_worker() for _ in range(concurrency)))
+        res.wall_s = time.perf_counter() - t0
+        done.set()
+        if sampler:
+            await sampler
+        after = await _stats(client, stats_url)
+        if before and after:
+            res.cpu_s = after["cpu_s"] - before["cpu_s"]
+    return res
+
+
+def summarize(bridge: PhaseResult, direct: PhaseResult | None, concurrency: int) -> dict[str, Any]:
+    """汇总为可比较的 JSON：RPS、延迟分位、相对直连的附加延迟、每 token CPU、每流内存。"""
+    ok = len(bridge.latencies_ms)
+    out: dict[str, Any] = {
+        "requests_ok": ok,
+        "errors": bridge.errors,
+        "wall_s": round(bridge.wall_s, 4),
+        "rps": round(ok / bridge.wall_s, 2) if bridge.wall_s else None,
+        "completion_tokens": bridge.completion_tokens,
+        "latency_ms": {f"p{p}": percentile(bridge.latencies_ms, p) for p in (50, 95, 99)},
+    }
+    if bridge.ttft_ms:
+        out["ttft_ms"] = {f"p{p}": percentile(bridge.ttft_ms, p) for p in (50, 95, 99)}
+    if direct is not None:
+        out["direct_latency_ms"] = {f"p{p}": percentile(direct.latencies_ms, p) for p in (50, 95, 99)}
+        added: dict[str, float | None] = {}
+        for p in (50, 95, 99):
+            b, d = percentile(bridge.latencies_ms, p), percentile(direct.latencies_ms, p)
+            added[f"p{p}"] = round(b - d, 3) if b is not None and d is not None else None
+        out["added_latency_ms"] = added
+        if bridge.ttft_ms and direct.ttft_ms:
+            out["added_ttft_ms"] = {
+                f"p{p}": round(percentile(bridge.ttft_ms, p) - percentile(direct.ttft_ms, p), 3)
+                for p in (50, 95, 99)
+            }
+    if bridge.cpu_s is not None:
+        out["bridge_cpu_s"] = round(bridge.cpu_s, 4)
+        if bridge.completion_tokens:
+            out["cpu_us_per_token"] = round(bridge.cpu_s / bridge.completion_tokens * 1e6, 3)
+    if bridge.rss_idle_bytes is not None and bridge.rss_peak_bytes is not None:
+        out["rss_idle_bytes"] = bridge.rss_idle_bytes
+        out["rss_peak_bytes"] = bridge.rss_peak_bytes
+        out["memory_bytes_per_open_stream"] = (bridge.rss_peak_bytes - bridge.rss_idle_bytes) // max(1, concurrency)
+    return out
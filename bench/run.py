@@ -0,0 +1,126 @@
+# bench/run.py - 一键压测：拉起桩上游与桥接（桩 MongoDB），跑流式 / 非流式并写出 JSON 结果
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from bench import loadgen, stub_upstream
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _wait_ready(url: str, timeout_s: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"服务未就绪: {url}")
+
+
+def _spawn(module: str, *args: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", module, *args], cwd=ROOT)
+
+
+async def _run(args: argparse.Namespace) -> dict:
+    bridge_url = f"http://127.0.0.1:{args.bridge_port}/v1/chat/completions"
+    direct_url = f"http://127.0.0.1:{args.upstream_port}/v1/chat/completions"
+    stats_url = f"http://127.0.0.1:{args.bridge_port}/__bench/stats"
+    messages = [{"role": "user", "content": args.prompt}]
+    results: dict[str, dict] = {}
+    modes = {"stream": [True], "non_stream": [False], "both": [True, False]}[args.mode]
+    for stream in modes:
+        name = "stream" if stream else "non_stream"
+        # 预热：建立连接、加载编码与 litellm 内部缓存，不计入结果
+        await loadgen.run_phase(bridge_url, args.api_key, stream, args.concurrency, args.warmup, messages)
+        direct = await loadgen.run_phase(direct_url, "stub", stream, args.concurrency, args.requests, messages)
+        bridge = await loadgen.run_phase(
+            bridge_url, args.api_key, stream, args.concurrency, args.requests, messages, stats_url=stats_url
+        )
+        results[name] = loadgen.summarize(bridge, direct, args.concurrency)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="openclaw-llm-bridge 压测")
+    parser.add_argument("--mode", choices=("stream", "non_stream", "both"), default="both")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500, help="每种模式的请求数")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--prompt", default="hello from the openclaw bench")
+    parser.add_argument("--api-key", default="sk-bench-key")
+    parser.add_argument("--storage", choices=("mongo-stub", "memory", "sqlite"), default="mongo-stub")
+    parser.add_argument("--bridge-port", type=int, default=9000)
+    parser.add_argument("--upstream-port", type=int, default=9100)
+    parser.add_argument("--output", default=None, help="结果 JSON 路径，默认 bench/results/<时间>-<commit>.json")
+    stub_upstream.add_arguments(parser)
+    args = parser.parse_args()
+
+    stub_args = [
+        "--port", str(args.upstream_port),
+        "--token-rate", str(args.token_rate),
+        "--ttft-ms", str(args.ttft_ms),
+        "--chunk-tokens", str(args.chunk_tokens),
+        "--completion-tokens", str(args.completion_tokens),
+        "--error-rate", str(args.error_rate),
+        "--error-status", str(args.error_status),
+    ]
+    procs = [_spawn("bench.stub_upstream", *stub_args)]
+    try:
+        _wait_ready(f"http://127.0.0.1:{args.upstream_port}/healthz")
+        procs.append(
+            _spawn(
+                "bench.bridge_server",
+                "--port", str(args.bridge_port),
+                "--upstream", f"http://127.0.0.1:{args.upstream_port}",
+                "--api-key", args.api_key,
+                "--storage", args.storage,
+            )
+        )
+        _wait_ready(f"http://127.0.0.1:{args.bridge_port}/healthz", timeout_s=60.0)
+        results = asyncio.run(_run(args))
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait(timeout=10)
+
+    commit = _git_commit()
+    now = datetime.now(timezone.utc)
+    report = {
+        "meta": {
+            "timestamp": now.isoformat(),
+            "git_commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+        },
+        "results": results,
+    }
+    out = Path(args.output) if args.output else ROOT / "bench" / "results" / f"{now:%Y%m%dT%H%M%S}-{commit or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    print(f"结果已写入 {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# bench/stub_mongo.py - 进程内 MongoDB 替身：实现桥接用到的 motor 集合接口子集
+
+import copy
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass
+class _UpdateResult:
+    matched_count: int
+    modified_count: int
+
+
+def _matches(doc: dict, flt: dict) -> bool:
+    """仅支持等值匹配，足够覆盖 users / audit_logs 的查询。"""
+    return all(doc.get(k) == v for k, v in flt.items())
+
+
+def _project(doc: dict, projection: dict | None) -> dict:
+    if not projection:
+        return copy.copy(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    out = {k: v for k, v in doc.items() if k in include} if include else copy.copy(doc)
+    if projection.get("_id", 1) and "_id" in doc:
+        out["_id"] = doc["_id"]
+    else:
+        out.pop("_id", None)
+    return out
+
+
+def _apply_update(doc: dict, update: dict) -> None:
+    for k, v in (update.get("$inc") or {}).items():
+        doc[k] = (doc.get(k) or 0) + v
+    for k, v in (update.get("$set") or {}).items():
+        doc[k] = v
+
+
+class _Cursor:
+    def __init__(self, docs: list[dict]):
+        self._docs = docs
+
+    def __aiter__(self):
+        self._it = iter(self._docs)
+        return self
+
+    async def __anext__(self) -> dict:
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeCollection:
+    """内存集合；单事件循环内每个方法无 await 点，天然原子。"""
+
+    def __init__(self) -> None:
+        self.docs: list[dict] = []
+        self._next_id = 0
+
+    def _find(self, flt: dict) -> dict | None:
+        for doc in self.docs:
+            if _matches(doc, flt):
+                return doc
+        return None
+
+    async def find_one(self, flt: dict, projection: dict | None = None) -> dict | None:
+        doc = self._find(flt)
+        return _project(doc, projection) if doc is not None else None
+
+    def find(self, flt: dict, projection: dict | None = None) -> _Cursor:
+        return _Cursor([_project(d, projection) for d in self.docs if _matches(d, flt)])
+
+    async def create_index(self, keys: Any) -> str:
+        return str(keys)
+
+    async def insert_one(self, doc: dict) -> None:
+        self._next_id += 1
+        doc.setdefault("_id", self._next_id)
+        self.docs.append(doc)
+
+    async def update_one(self, flt: dict, update: dict) -> _UpdateResult:
+        doc = self._find(flt)
+        if doc is None:
+            return _UpdateResult(0, 0)
+        _apply_update(doc, update)
+        return _UpdateResult(1, 1)
+
+    async def find_one_and_update(
+        self,
+        flt: dict,
+        update: dict,
+        return_document: bool = False,
+        projection: dict | None = None,
+    ) -> dict | None:
+        doc = self._find(flt)
+        if doc is None:
+            return None
+        before = _project(doc, projection)
+        _apply_update(doc, update)
+        return _project(doc, projection) if return_document else before
+
+
+class FakeDatabase:
+    """按集合名懒创建 FakeCollection，接口与 AsyncIOMotorDatabase 的下标访问一致。"""
+
+    def __init__(self) -> None:
+        self._collections: dict[str, FakeCollection] = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection()
+        return self._collections[name]
+
+    async def command(self, name: str) -> dict:
+        return {"ok": 1.0}
+
+
+def install(db: Any | None = None) -> FakeDatabase:
+    """将替身注入 database 模块，之后 get_db() 返回它。"""
+    import database
+
+    fake = db or FakeDatabase()
+    database._db = fake
+    return fake
@@ -0,0 +1,162 @@
+# bench/stub_upstream.py - OpenAI 兼容的本地桩上游：可配置吐字速率、首字延迟、分块大小与错误注入
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class StubConfig:
+    """桩上游行为参数。"""
+
+    token_rate: float = 200.0  # 每秒吐出的 token 数；<=0 表示不限速
+    ttft_ms: float = 50.0  # 首个 token 前的等待（毫秒）
+    chunk_tokens: int = 1  # 每个 SSE chunk 携带的 token 数
+    completion_tokens: int = 128  # 每次回复的 token 数
+    error_rate: float = 0.0  # 注入错误的概率（0~1）
+    error_status: int = 500  # 注入错误时返回的 HTTP 状态码
+
+
+def _prompt_tokens(messages: list[dict[str, Any]]) -> int:
+    """粗略估算输入 token（按空白切分），桩上游不依赖 tiktoken。"""
+    total = 0
+    for msg in messages:
+        total += 4 + len(str(msg.get("content") or "").split())
+    return total
+
+
+def _chunk(cid: str, model: str, delta: dict, finish_reason: str | None = None) -> dict:
+    return {
+        "id": cid,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def create_app(cfg: StubConfig) -> FastAPI:
+    """构建桩上游 app；同时挂载 Azure 部署路径与 /v1 路径，便于桥接与直连基线共用。"""
+    app = FastAPI(title="OpenClaw bench stub upstream")
+
+    async def _stream(cid: str, model: str, prompt_tokens: int, include_usage: bool) -> AsyncIterator[str]:
+        delay = cfg.chunk_tokens / cfg.token_rate if cfg.token_rate > 0 else 0.0
+        await asyncio.sleep(cfg.ttft_ms / 1000)
+        yield f"data: {json.dumps(_chunk(cid, model, {'role': 'assistant', 'content': ''}))}\n\n"
+        sent = 0
+        while sent < cfg.completion_tokens:
+            n = min(cfg.chunk_tokens, cfg.completion_tokens - sent)
+            sent += n
+            yield f"data: {json.dumps(_chunk(cid, model, {'content': 'tok ' * n}))}\n\n"
+            if delay:
+                await asyncio.sleep(delay)
+        yield f"data: {json.dumps(_chunk(cid, model, {}, 'stop'))}\n\n"
+        if include_usage:
+            usage_chunk = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": cfg.completion_tokens,
+                    "total_tokens": prompt_tokens + cfg.completion_tokens,
+                },
+            }
+            yield f"data: {json.dumps(usage_chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def _completions(request: Request, model: str) -> Any:
+        body = await request.json()
+        if cfg.error_rate > 0 and random.random() < cfg.error_rate:
+            return JSONResponse(
+                status_code=cfg.error_status,
+                content={"error": {"type": "api_error", "code": "injected", "message": "stub injected error"}},
+            )
+        cid = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+        prompt_tokens = _prompt_tokens(body.get("messages") or [])
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(
+                _stream(cid, model, prompt_tokens, include_usage),
+                media_type="text/event-stream",
+            )
+        gen_s = cfg.completion_tokens / cfg.token_rate if cfg.token_rate > 0 else 0.0
+        await asyncio.sleep(cfg.ttft_ms / 1000 + gen_s)
+        return {
+            "id": cid,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "tok " * cfg.completion_tokens},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": cfg.completion_tokens,
+                "total_tokens": prompt_tokens + cfg.completion_tokens,
+            },
+        }
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def azure_chat_completions(deployment: str, request: Request):
+        return await _completions(request, deployment)
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await _completions(request, "stub-model")
+
+    @app.get("/healthz")
+    async def healthz():
+        return {"ok": True}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """注册桩上游参数，run.py 复用同一组参数。"""
+    d = StubConfig()
+    parser.add_argument("--token-rate", type=float, default=d.token_rate, help="每秒 token 数，<=0 不限速")
+    parser.add_argument("--ttft-ms", type=float, default=d.ttft_ms, help="首 token 延迟（毫秒）")
+    parser.add_argument("--chunk-tokens", type=int, default=d.chunk_tokens, help="每个 chunk 的 token 数")
+    parser.add_argument("--completion-tokens", type=int, default=d.completion_tokens, help="每次回复 token 数")
+    parser.add_argument("--error-rate", type=float, default=d.error_rate, help="错误注入概率 0~1")
+    parser.add_argument("--error-status", type=int, default=d.error_status, help="注入错误的状态码")
+
+
+def config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        token_rate=args.token_rate,
+        ttft_ms=args.ttft_ms,
+        chunk_tokens=max(1, args.chunk_tokens),
+        completion_tokens=max(0, args.completion_tokens),
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="OpenAI 兼容桩上游")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,26 @@ class Settings(BaseSettings):
     MONGODB_URI: str = "mongodb://localhost:27017"
     MONGODB_DB: str = ""  # 为空时从 MONGODB_URI 的 path 解析，解析不到则用默认值
 
+    # 存储后端：mongo / sqlite / memory
+    STORAGE_BACKEND: str = "mongo"
+    SQLITE_PATH: str = "openclaw_llm_bridge.db"
+    SQLITE_COMMIT_BATCH: int = 64  # 累计多少次写入后提交
+    SQLITE_COMMIT_INTERVAL_MS: int = 50  # 未提交写入的最长停留时间
+
+    # 审计归档：早于保留期的 audit_logs 移入本地压缩 JSONL 分区文件
+    AUDIT_ARCHIVE_DIR: str = "archive/audit_logs"
+    AUDIT_ARCHIVE_RETENTION_DAYS: int = 90
+    AUDIT_ARCHIVE_BATCH: int = 5000
+
+    # 批处理：上传文件与结果落盘目录、全局并发上限、单文件限制、每条请求默认预留的 output token
+    BATCH_DIR: str = "batches"
+    BATCH_CONCURRENCY: int = 8
+    BATCH_MAX_FILE_BYTES: int = 200 * 1024 * 1024
+    BATCH_MAX_REQUESTS: int = 50000
+    BATCH_OUTPUT_RESERVE: int = 256
+    BATCH_HEARTBEAT_S: float = 10.0  # 属主刷新心跳 / 检查取消请求的间隔
+    BATCH_STALE_S: float = 60.0  # 心跳超过该时长未刷新的任务由其他进程回收
+
     # 管理端安全
     ADMIN_TOKEN: str = ""
 
@@ -27,9 +47,17 @@ class Settings(BaseSettings):
     LLM_ENDPOINT: str = "https://monster.cognitiveservices.azure.com"
     LLM_API_VERSION: str = "2024-12-01-preview"
 
+    # 上游连接池（交给 litellm 复用）
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE: int = 20
+
     # 可选：tiktoken 编码，与模型对齐
     TIKTOKEN_ENCODING: str = "cl100k_base"
 
+    # 启动预热：lifespan 最多等待的秒数，超时或失败的步骤转入后台重试
+    WARMUP_TIMEOUT_S: float = 30.0
+    WARMUP_RETRY_INTERVAL_S: float = 5.0
+
 
 def get_settings() -> Settings:
     return Settings()
@@ -1,17 +1,30 @@
 # main.py - openclaw-llm-bridge 路由入口：OpenAI 兼容 /v1/chat/completions + 管理端
 
-import json
 import time
+
+_IMPORT_START = time.perf_counter()
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Any
 
-from fastapi import FastAPI, Header, HTTPException, Request
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
 from config import get_settings
-from database import get_db
-from models import AuditLogDoc, UserKeyCreate, UserKeyUpdate
-from services import audit_service, auth_service, billing_service, proxy_service
+from models import AuditArchiveRequest, AuditLogDoc, BatchCreate, UserKeyCreate, UserKeyInDB, UserKeyUpdate
+from services import (
+    archive_service,
+    audit_service,
+    auth_service,
+    batch_service,
+    billing_service,
+    proxy_service,
+    warmup_service,
+)
+from storage import get_storage
 from utils.logger import get_logger, setup_logging
 from utils.token_counter import count_tokens_text_async
 
@@ -19,12 +32,29 @@ from utils.token_counter import count_tokens_text_async
 setup_logging()
 logger = get_logger("main")
 
+# 模块导入耗时（litellm / tiktoken / motor 已改为懒加载，由 lifespan 预热）
+_IMPORT_MS = (time.perf_counter() - _IMPORT_START) * 1000
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """启动时并行预热依赖，关闭时释放连接池与存储。"""
+    await warmup_service.warmup(import_ms=_IMPORT_MS)
+    await batch_service.start()
+    yield
+    await archive_service.shutdown()
+    await batch_service.shutdown()
+    await warmup_service.shutdown()
+
+
 app = FastAPI(
     title="OpenClaw LLM Bridge",
     description="OpenAI 协议兼容网关，Token 计费与审计",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+
 # ---------- 依赖 ----------
 
 
@@ -45,6 +75,24 @@ def _openai_error(code: str, message: str, status: int = 400) -> dict:
     }
 
 
+# ---------- 健康检查 ----------
+
+
+@app.get("/healthz")
+async def healthz():
+    """存活探针：进程可响应即返回 200。"""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """就绪探针：预热全部完成返回 200，否则 503 并附各步骤状态。"""
+    body = {"status": "ready" if warmup_service.is_ready() else "starting", "steps": warmup_service.status()}
+    if not warmup_service.is_ready():
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
 # ---------- /v1/chat/completions（代理 + 计费 + 审计） ----------
 
 
@@ -112,16 +160,7 @@ async def chat_completions(
     async def _consume_stream():
         nonlocal usage_from_chunk
         async for chunk in chunk_iter:
-            choices = chunk.get("choices") or []
-            if choices and isinstance(choices[0], dict):
-                delta = (choices[0] or {}).get("delta") or {}
-                if isinstance(delta, dict) and delta.get("content"):
-                    collected_content.append(delta["content"])
-                # 流式末尾可能带 usage
-                u = (choices[0] or {}).get("usage") or chunk.get("usage")
-                if u and isinstance(u, dict):
-                    usage_from_chunk["input_tokens"] = u.get("input_tokens") or u.get("prompt_tokens") or 0
-                    usage_from_chunk["output_tokens"] = u.get("output_tokens") or u.get("completion_tokens") or 0
+            proxy_service.apply_chunk(chunk, collected_content, usage_from_chunk)
             yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
         yield "data: [DONE]\n\n"
 
@@ -153,15 +192,7 @@ async def chat_completions(
     full_chunks: list[dict] = []
     async for c in chunk_iter:
         full_chunks.append(c)
-        choices = c.get("choices") or []
-        if choices and isinstance(choices[0], dict):
-            delta = (choices[0] or {}).get("delta") or {}
-            if isinstance(delta, dict) and delta.get("content"):
-                collected_content.append(delta["content"])
-            u = (choices[0] or {}).get("usage") or c.get("usage")
-            if u and isinstance(u, dict):
-                usage_from_chunk["input_tokens"] = u.get("input_tokens") or u.get("prompt_tokens") or 0
-                usage_from_chunk["output_tokens"] = u.get("output_tokens") or u.get("completion_tokens") or 0
+        proxy_service.apply_chunk(c, collected_content, usage_from_chunk)
     # 合并为单条 OpenAI 格式响应（取最后一条的 id/model，choices 合并 content）
     input_tokens_final = usage_from_chunk.get("input_tokens")
     output_tokens_final = usage_from_chunk.get("output_tokens")
@@ -189,23 +220,9 @@ async def chat_completions(
     )
     # 非流式时构造一条完整响应返回
     last = full_chunks[-1] if full_chunks else {}
-    merged = {
-        "id": last.get("id", "chatcmpl-bridge"),
-        "object": "chat.completion",
-        "model": model,
-        "choices": [
-            {
-                "index": 0,
-                "message": {"role": "assistant", "content": "".join(collected_content)},
-                "finish_reason": "stop",
-            }
-        ],
-        "usage": {
-            "prompt_tokens": input_tokens_final,
-            "completion_tokens": output_tokens_final,
-            "total_tokens": total,
-        },
-    }
+    merged = proxy_service.build_completion_response(
+        last, model, "".join(collected_content), input_tokens_final, output_tokens_final
+    )
     return merged
 
 
@@ -244,6 +261,106 @@ async def _after_stream_billing_and_audit(
     )
 
 
+# ---------- /v1/files 与 /v1/batches（离线批处理） ----------
+
+
+async def _require_user(authorization: str | None) -> tuple[str, UserKeyInDB]:
+    """校验 Bearer api_key，返回 (api_key, 用户)。"""
+    api_key = _get_bearer_key(authorization)
+    if not api_key:
+        raise HTTPException(status_code=401, detail=_openai_error("invalid_request_error", "Missing or invalid Authorization header"))
+    user = await auth_service.get_user_by_api_key(api_key)
+    if not user:
+        raise HTTPException(status_code=401, detail=_openai_error("invalid_api_key", "Invalid API key or key is frozen"))
+    return api_key, user
+
+
+def _batch_http_error(e: batch_service.BatchError) -> HTTPException:
+    return HTTPException(status_code=e.status, detail=_openai_error(e.code, e.message))
+
+
+@app.post("/v1/files")
+async def upload_file(
+    request: Request,
+    purpose: str = Query("batch"),
+    filename: str = Query("batch.jsonl"),
+    authorization: str | None = Header(None),
+):
+    """
+    上传批处理输入：请求体即 JSONL 原文（Content-Type: application/jsonl），按块流式写盘。
+    每行格式：{"custom_id": "...", "method": "POST", "url": "/v1/chat/completions", "body": {...}}。
+    """
+    api_key, _ = await _require_user(authorization)
+    if (request.headers.get("content-type") or "").startswith("multipart/"):
+        raise HTTPException(
+            status_code=415,
+            detail=_openai_error("invalid_request_error", "Upload the JSONL as the raw request body, not multipart"),
+        )
+    try:
+        doc = await batch_service.save_upload(request.stream(), filename, purpose, api_key)
+    except batch_service.BatchError as e:
+        raise _batch_http_error(e)
+    return doc.public()
+
+
+@app.get("/v1/files/{file_id}")
+async def get_file(file_id: str, authorization: str | None = Header(None)):
+    """文件元数据。"""
+    api_key, _ = await _require_user(authorization)
+    doc = await batch_service.get_file(file_id, api_key)
+    if doc is None:
+        raise HTTPException(status_code=404, detail=_openai_error("invalid_request_error", "file not found"))
+    return doc.public()
+
+
+@app.get("/v1/files/{file_id}/content")
+async def get_file_content(file_id: str, authorization: str | None = Header(None)):
+    """下载文件内容（输入或结果 JSONL），由磁盘分块发送。"""
+    api_key, _ = await _require_user(authorization)
+    doc = await batch_service.get_file(file_id, api_key)
+    if doc is None:
+        raise HTTPException(status_code=404, detail=_openai_error("invalid_request_error", "file not found"))
+    return FileResponse(batch_service.file_path(doc.id), media_type="application/jsonl", filename=doc.filename)
+
+
+@app.post("/v1/batches")
+async def create_batch(payload: BatchCreate, authorization: str | None = Header(None)):
+    """创建批处理任务：后台校验、一次性预留余额后并发执行。"""
+    api_key, user = await _require_user(authorization)
+    try:
+        job = await batch_service.create_batch(
+            payload.input_file_id,
+            payload.endpoint,
+            payload.completion_window,
+            payload.metadata,
+            api_key,
+            user.user_name,
+        )
+    except batch_service.BatchError as e:
+        raise _batch_http_error(e)
+    return job.public()
+
+
+@app.get("/v1/batches/{batch_id}")
+async def get_batch(batch_id: str, authorization: str | None = Header(None)):
+    """查询任务状态与进度。"""
+    api_key, _ = await _require_user(authorization)
+    job = await batch_service.get_batch(batch_id, api_key)
+    if job is None:
+        raise HTTPException(status_code=404, detail=_openai_error("invalid_request_error", "batch not found"))
+    return job.public()
+
+
+@app.post("/v1/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str, authorization: str | None = Header(None)):
+    """取消任务：已完成条目保留在结果文件中。"""
+    api_key, _ = await _require_user(authorization)
+    job = await batch_service.cancel_batch(batch_id, api_key)
+    if job is None:
+        raise HTTPException(status_code=404, detail=_openai_error("invalid_request_error", "batch not found"))
+    return job.public()
+
+
 # ---------- 管理端：Key 管理（需 ADMIN_TOKEN） ----------
 
 
@@ -261,11 +378,6 @@ async def admin_create_key(
 ):
     """创建新 Key。"""
     await require_admin(authorization)
-    db = get_db()
-    from database import COLL_USERS
-    existing = await db[COLL_USERS].find_one({"api_key": payload.api_key})
-    if existing:
-        raise HTTPException(status_code=400, detail="api_key already exists")
     doc = {
         "api_key": payload.api_key,
         "user_name": payload.user_name,
@@ -273,7 +385,8 @@ async def admin_create_key(
         "status": payload.status,
         "created_at": datetime.utcnow(),
     }
-    await db[COLL_USERS].insert_one(doc)
+    if not await get_storage().create_key(doc):
+        raise HTTPException(status_code=400, detail="api_key already exists")
     return {"ok": True, "api_key": payload.api_key, "user_name": payload.user_name, "balance_tokens": payload.balance_tokens, "status": payload.status}
 
 
@@ -283,13 +396,7 @@ async def admin_list_keys(
 ):
     """查看所有 Key 及余额。"""
     await require_admin(authorization)
-    db = get_db()
-    from database import COLL_USERS
-    cursor = db[COLL_USERS].find({}, {"_id": 0, "api_key": 1, "user_name": 1, "balance_tokens": 1, "status": 1, "created_at": 1})
-    keys = []
-    async for doc in cursor:
-        keys.append(doc)
-    return {"keys": keys}
+    return {"keys": await get_storage().list_keys()}
 
 
 @app.patch("/admin/keys/{api_key:path}")
@@ -300,21 +407,59 @@ async def admin_update_key(
 ):
     """充值或冻结 Key。"""
     await require_admin(authorization)
-    db = get_db()
-    from database import COLL_USERS
-    update: dict = {}
-    if payload.balance_tokens is not None:
-        update["$inc"] = {"balance_tokens": payload.balance_tokens}
-    if payload.status is not None:
-        update["$set"] = update.get("$set", {})
-        update["$set"]["status"] = payload.status
-    if not update:
+    if payload.balance_tokens is None and payload.status is None:
         return {"ok": True, "message": "no changes"}
-    # 合并 $inc 与 $set 到同一次 update
-    result = await db[COLL_USERS].update_one({"api_key": api_key}, update)
-    if result.matched_count == 0:
+    matched, modified = await get_storage().update_key(api_key, payload.balance_tokens, payload.status)
+    if matched == 0:
         raise HTTPException(status_code=404, detail="api_key not found")
-    return {"ok": True, "matched": result.matched_count, "modified": result.modified_count}
+    return {"ok": True, "matched": matched, "modified": modified}
+
+
+# ---------- 管理端：审计归档与导出（需 ADMIN_TOKEN） ----------
+
+
+@app.post("/admin/audit/archive")
+async def admin_archive_audit(
+    payload: AuditArchiveRequest,
+    authorization: str | None = Header(None),
+):
+    """在后台将早于截止时间的审计记录归档到本地压缩文件并从存储中删除，返回 run_id。"""
+    await require_admin(authorization)
+    cutoff = payload.before or archive_service.default_cutoff(payload.older_than_days)
+    try:
+        run = archive_service.start_archive(cutoff)
+    except archive_service.ArchiveBusyError as e:
+        raise HTTPException(status_code=409, detail={"detail": str(e)})
+    return JSONResponse(status_code=202, content=run)
+
+
+@app.get("/admin/audit/archive/{run_id}")
+async def admin_archive_status(run_id: str, authorization: str | None = Header(None)):
+    """查询归档任务状态（running / completed / failed）与已归档条数。"""
+    await require_admin(authorization)
+    run = await asyncio.to_thread(archive_service.get_run, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="archive run not found")
+    return run
+
+
+@app.get("/admin/audit/export")
+async def admin_export_audit(
+    start: datetime = Query(..., description="起始时间（含），ISO 8601"),
+    end: datetime | None = Query(None, description="结束时间（不含），默认当前时间"),
+    authorization: str | None = Header(None),
+):
+    """流式导出时间区间内的审计记录（JSONL），合并归档文件与在线记录。"""
+    await require_admin(authorization)
+    end = end or datetime.utcnow()
+    if archive_service.naive_utc(end) <= archive_service.naive_utc(start):
+        raise HTTPException(status_code=400, detail="end must be later than start")
+    filename = f"audit_logs_{start:%Y%m%dT%H%M%S}_{end:%Y%m%dT%H%M%S}.jsonl"
+    return StreamingResponse(
+        archive_service.export_audit_logs(start, end),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 # ---------- 访问日志中间件 ----------
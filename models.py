@@ -65,3 +65,79 @@ class AuditLogDoc(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class AuditArchiveRequest(BaseModel):
+    """触发审计归档：归档 before 之前的记录；不传则按 older_than_days / 配置的保留天数计算。"""
+
+    before: Optional[datetime] = Field(None, description="截止时间（UTC），早于此时间的记录被归档")
+    older_than_days: Optional[int] = Field(None, ge=0, description="归档多少天以前的记录")
+
+
+class BatchAuditLogDoc(AuditLogDoc):
+    """批处理任务按模型聚合的审计记录：token 为该批次该模型的合计。"""
+
+    batch_id: str
+    request_count: int = 0
+    failed_count: int = 0
+
+
+# ---------- 批处理（OpenAI Batch API 兼容） ----------
+
+
+class FileObject(BaseModel):
+    """上传 / 产出的 JSONL 文件元数据；api_key 为属主，不对外返回。"""
+
+    id: str
+    object: str = "file"
+    bytes: int = 0
+    created_at: int
+    filename: str
+    purpose: str  # batch / batch_output
+    api_key: str = ""
+
+    def public(self) -> dict:
+        return self.model_dump(exclude={"api_key"})
+
+
+class BatchCreate(BaseModel):
+    """创建批处理任务的请求体。"""
+
+    input_file_id: str = Field(..., min_length=1)
+    endpoint: str = Field(default="/v1/chat/completions", description="目前仅支持 /v1/chat/completions")
+    completion_window: str = Field(default="24h")
+    metadata: Optional[dict] = None
+
+
+class BatchJob(BaseModel):
+    """批处理任务状态；api_key / user_name / token 预留字段仅内部使用。"""
+
+    id: str
+    object: str = "batch"
+    endpoint: str = "/v1/chat/completions"
+    input_file_id: str
+    completion_window: str = "24h"
+    status: str = "validating"  # validating / in_progress / finalizing / completed / failed / cancelling / cancelled
+    output_file_id: Optional[str] = None
+    error_file_id: Optional[str] = None
+    errors: Optional[dict] = None
+    created_at: int
+    in_progress_at: Optional[int] = None
+    finalizing_at: Optional[int] = None
+    completed_at: Optional[int] = None
+    failed_at: Optional[int] = None
+    cancelled_at: Optional[int] = None
+    request_counts: dict = Field(default_factory=lambda: {"total": 0, "completed": 0, "failed": 0})
+    metadata: Optional[dict] = None
+
+    api_key: str = ""
+    user_name: str = ""
+    reserved_tokens: int = 0
+    used_tokens: int = 0
+    owner: str = ""  # 执行该任务的进程实例 id
+    heartbeat_at: int = 0  # 属主最近一次落盘时间，超时视为属主已退出
+
+    def public(self) -> dict:
+        return self.model_dump(
+            exclude={"api_key", "user_name", "reserved_tokens", "used_tokens", "owner", "heartbeat_at"}
+        )
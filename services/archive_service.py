@@ -0,0 +1,475 @@
+# services/archive_service.py - 审计日志归档（按天分区的 gzip JSONL + manifest）与区间流式导出
+
+import argparse
+import asyncio
+import fcntl
+import gzip
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Optional
+
+from config import get_settings
+from storage import get_storage
+from utils.logger import get_logger
+
+logger = get_logger("archive_service")
+
+MANIFEST_NAME = "manifest.jsonl"
+LOCK_NAME = ".lock"
+_READ_LINES = 1000  # 导出时每次从归档文件读取的行数
+_LOCK_POLL_S = 0.2  # 等待归档目录文件锁的轮询间隔
+
+# 同一进程内只允许一个归档任务；多实例部署应只在一个节点上调度归档
+_lock = asyncio.Lock()
+_runs: dict[str, dict[str, Any]] = {}  # 本进程发起的归档任务状态（run_id -> 摘要）
+_tasks: set[asyncio.Task] = set()
+
+
+class ArchiveBusyError(Exception):
+    """已有归档任务在运行。"""
+
+
+def naive_utc(dt: datetime) -> datetime:
+    """审计时间戳统一为 naive UTC（与 datetime.utcnow 一致）；带时区的输入先转 UTC。"""
+    if dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _json_default(v: Any) -> Any:
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return str(v)
+
+
+def _dumps(doc: dict[str, Any]) -> bytes:
+    return (json.dumps(doc, ensure_ascii=False, default=_json_default) + "\n").encode("utf-8")
+
+
+def _archive_root(archive_dir: Optional[str]) -> Path:
+    return Path(archive_dir or get_settings().AUDIT_ARCHIVE_DIR)
+
+
+def _audit_id(v: Any) -> Any:
+    """存储 _id 转为可写入 JSON 的 audit_id：整数保持原样，其余（如 ObjectId）转字符串。"""
+    return v if isinstance(v, int) else str(v)
+
+
+def _to_record(doc: dict[str, Any]) -> dict[str, Any]:
+    record = {k: v for k, v in doc.items() if k != "_id"}
+    if "_id" in doc:
+        record["audit_id"] = _audit_id(doc["_id"])
+    return record
+
+
+@asynccontextmanager
+async def _locked(root: Path, exclusive: bool) -> AsyncIterator[None]:
+    """
+    归档目录文件锁（跨进程）：归档每批写文件 → 删除 → commit 持有排他锁；
+    导出只在读取 manifest 增量与一页在线记录时短暂持有共享锁，向客户端产出数据时不持锁。
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    fd = os.open(root / LOCK_NAME, os.O_RDWR | os.O_CREAT, 0o644)
+    op = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+    try:
+        while True:
+            try:
+                fcntl.flock(fd, op)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(_LOCK_POLL_S)
+        yield
+    finally:
+        os.close(fd)
+
+
+# ---------- 文件读写（同步，在线程中执行） ----------
+
+
+def _write_part(path: Path, docs: list[dict[str, Any]]) -> int:
+    """写入临时文件并 fsync 后原子改名，返回压缩后字节数。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as gz:
+            for doc in docs:
+                gz.write(_dumps(doc))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    return path.stat().st_size
+
+
+def _append_manifest(root: Path, entry: dict[str, Any]) -> None:
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / MANIFEST_NAME, "ab") as f:
+        f.write(_dumps(entry))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_manifest(archive_dir: Optional[str] = None) -> list[dict[str, Any]]:
+    """
+    读取 manifest 全部条目；manifest 不存在时返回空列表。
+    kind 为 file（归档文件，旧条目无 kind）、commit（文件中的记录已从存储删除）
+    或 run（归档任务开始 / 结束时的状态）。
+    """
+    path = _archive_root(archive_dir) / MANIFEST_NAME
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _pending_files(entries: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """已写入但删除未确认的归档文件（kind=file 且没有对应的 commit）；旧版条目无 kind，视为已确认。"""
+    committed = {p for e in entries if e.get("kind") == "commit" for p in e["paths"]}
+    return [e for e in entries if e.get("kind") == "file" and e["path"] not in committed]
+
+
+def _read_manifest_from(root: Path, offset: int) -> tuple[list[dict[str, Any]], int]:
+    """从字节偏移 offset 起读取 manifest 新增的完整行，返回 (条目, 新偏移)；末尾未写完的行留到下次。"""
+    path = root / MANIFEST_NAME
+    if not path.exists():
+        return [], offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    entries = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return entries, offset + end
+
+
+def _read_audit_ids(path: Path) -> list[Any]:
+    with gzip.open(path, "rb") as fh:
+        ids = [json.loads(line).get("audit_id") for line in fh if line.strip()]
+    return [i for i in ids if i is not None]
+
+
+def _read_lines(fh: BinaryIO, n: int) -> list[bytes]:
+    lines = []
+    for _ in range(n):
+        line = fh.readline()
+        if not line:
+            break
+        lines.append(line)
+    return lines
+
+
+# ---------- 归档 ----------
+
+
+def _new_run_id() -> str:
+    return f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+async def archive_audit_logs(
+    cutoff: datetime,
+    archive_dir: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    run_id: Optional[str] = None,
+) -> dict[str, Any]:
+    """
+    将早于 cutoff 的审计记录按 timestamp 升序分批移出存储：
+    每批按 UTC 日期分区写成 YYYY/MM/DD/audit-<run_id>-<seq>.jsonl.gz，fsync 并追加 manifest 后批量删除，
+    删除落盘后追加 commit。写文件与删除之间崩溃时，重跑先按文件中的 audit_id 补删在线副本再继续，
+    同一记录不会被归档两次。
+    任务开始与结束时各追加一条 kind=run 的 manifest 条目，供按 run_id 查询状态。
+    """
+    cutoff = naive_utc(cutoff)
+    root = _archive_root(archive_dir)
+    run_id = run_id or _new_run_id()
+    summary: dict[str, Any] = {
+        "run_id": run_id,
+        "status": "running",
+        "cutoff": cutoff.isoformat(),
+        "archived": 0,
+        "files": 0,
+        "started_at": datetime.utcnow().isoformat(),
+    }
+    _runs[run_id] = summary
+    async with _lock:
+        await asyncio.to_thread(_append_manifest, root, {"kind": "run", **summary})
+        try:
+            await _archive(cutoff, root, batch_size or get_settings().AUDIT_ARCHIVE_BATCH, summary)
+            summary["status"] = "completed"
+        except asyncio.CancelledError:
+            summary.update(status="failed", error="interrupted")
+            raise
+        except Exception as e:
+            logger.exception("审计归档失败: run_id=%s", run_id)
+            summary.update(status="failed", error=str(e))
+            raise
+        finally:
+            summary["finished_at"] = datetime.utcnow().isoformat()
+            await asyncio.to_thread(_append_manifest, root, {"kind": "run", **summary})
+
+    logger.info(
+        "审计归档完成: run_id=%s cutoff=%s archived=%s files=%s",
+        run_id, summary["cutoff"], summary["archived"], summary["files"],
+    )
+    return summary
+
+
+async def _repair(root: Path, run_id: str) -> None:
+    """补完中断的批次：按未确认文件中的 audit_id 再次删除在线副本（幂等）并追加 commit。"""
+    storage = get_storage()
+    async with _locked(root, exclusive=True):
+        for e in _pending_files(await asyncio.to_thread(read_manifest, str(root))):
+            path = root / e["path"]
+            if not path.exists():
+                logger.warning("未确认的归档文件缺失，无法补删: %s", path)
+                continue
+            ids = await asyncio.to_thread(_read_audit_ids, path)
+            deleted = await storage.delete_audit(ids)
+            await storage.flush()
+            await asyncio.to_thread(
+                _append_manifest, root, {"kind": "commit", "run_id": run_id, "paths": [e["path"]], "repaired": True}
+            )
+            logger.warning("已补完中断的归档批次: path=%s 补删=%s", e["path"], deleted)
+
+
+async def _archive(cutoff: datetime, root: Path, batch: int, summary: dict[str, Any]) -> None:
+    storage = get_storage()
+    run_id = summary["run_id"]
+    await _repair(root, run_id)
+    while True:
+        async with _locked(root, exclusive=True):
+            docs = await storage.fetch_audit_before(cutoff, batch)
+            if not docs:
+                break
+            by_day: dict[date, list[dict[str, Any]]] = {}
+            for doc in docs:
+                by_day.setdefault(doc["timestamp"].date(), []).append(doc)
+            paths = []
+            for day, group in sorted(by_day.items()):
+                summary["files"] += 1
+                rel = f"{day:%Y/%m/%d}/audit-{run_id}-{summary['files']:05d}.jsonl.gz"
+                size = await asyncio.to_thread(_write_part, root / rel, [_to_record(d) for d in group])
+                entry = {
+                    "kind": "file",
+                    "path": rel,
+                    "partition": day.isoformat(),
+                    "count": len(group),
+                    "min_ts": group[0]["timestamp"].isoformat(),
+                    "max_ts": group[-1]["timestamp"].isoformat(),
+                    "bytes": size,
+                    "run_id": run_id,
+                    "created_at": datetime.utcnow().isoformat(),
+                }
+                await asyncio.to_thread(_append_manifest, root, entry)
+                paths.append(rel)
+            deleted = await storage.delete_audit([d["_id"] for d in docs])
+            # 删除落盘（SQLite 批量提交）后才 commit，否则崩溃会让已确认的记录重新出现在存储中
+            await storage.flush()
+            await asyncio.to_thread(_append_manifest, root, {"kind": "commit", "run_id": run_id, "paths": paths})
+        summary["archived"] += deleted
+        if deleted < len(docs):
+            # 删除不完整时停止，避免反复归档同一批记录
+            logger.warning("归档删除不完整: run_id=%s 期望=%s 实际=%s", run_id, len(docs), deleted)
+            break
+
+
+async def _run_in_background(cutoff: datetime, run_id: str) -> None:
+    """后台归档任务；异常已记录到日志与 manifest，状态通过 get_run 查询。"""
+    try:
+        await archive_audit_logs(cutoff, run_id=run_id)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        pass
+
+
+def start_archive(cutoff: datetime) -> dict[str, Any]:
+    """在后台启动归档任务并立即返回其状态（含 run_id）；已有任务在运行时抛出 ArchiveBusyError。"""
+    if _lock.locked() or _tasks:
+        raise ArchiveBusyError("an archive run is already in progress")
+    cutoff = naive_utc(cutoff)
+    run_id = _new_run_id()
+    # 先登记，任务尚未开始执行时也能按 run_id 查到
+    _runs[run_id] = {"run_id": run_id, "status": "running", "cutoff": cutoff.isoformat(), "archived": 0, "files": 0}
+    task = asyncio.create_task(_run_in_background(cutoff, run_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return dict(_runs[run_id])
+
+
+def get_run(run_id: str, archive_dir: Optional[str] = None) -> Optional[dict[str, Any]]:
+    """
+    查询归档任务状态：本进程发起的任务取内存中的实时摘要，否则取 manifest 中该 run_id 的最后一条 run 条目。
+    进程在任务中途退出时 manifest 只有开始条目，状态停留在 running。
+    """
+    if run_id in _runs:
+        return dict(_runs[run_id])
+    last = None
+    for e in read_manifest(archive_dir):
+        if e.get("kind") == "run" and e.get("run_id") == run_id:
+            last = e
+    if last is not None:
+        last.pop("kind", None)
+    return last
+
+
+async def shutdown() -> None:
+    """取消后台归档任务；已写入并删除的批次保持有效，中断的批次按至少一次语义由下次重跑处理。"""
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def default_cutoff(older_than_days: Optional[int] = None) -> datetime:
+    days = get_settings().AUDIT_ARCHIVE_RETENTION_DAYS if older_than_days is None else older_than_days
+    return datetime.utcnow() - timedelta(days=days)
+
+
+# ---------- 导出 ----------
+
+
+async def _iter_archive_file(path: Path, start: datetime, end: datetime) -> AsyncIterator[bytes]:
+    fh = await asyncio.to_thread(gzip.open, path, "rb")
+    try:
+        while True:
+            lines = await asyncio.to_thread(_read_lines, fh, _READ_LINES)
+            if not lines:
+                return
+            kept = [
+                line for line in lines
+                if start <= datetime.fromisoformat(json.loads(line)["timestamp"]) < end
+            ]
+            if kept:
+                yield b"".join(kept)
+    finally:
+        await asyncio.to_thread(fh.close)
+
+
+def _overlaps(e: dict[str, Any], start: datetime, end: datetime) -> bool:
+    return (
+        e.get("kind", "file") == "file"
+        and datetime.fromisoformat(e["min_ts"]) < end
+        and datetime.fromisoformat(e["max_ts"]) >= start
+    )
+
+
+def _read_unexported(path: Path, cursor: datetime, seen: set[Any], end: datetime) -> list[tuple[bytes, Any]]:
+    """读取归档文件中位于在线读取游标之后（尚未从存储导出）且早于 end 的记录，返回 (行, audit_id)。"""
+    out = []
+    with gzip.open(path, "rb") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            doc = json.loads(line)
+            ts = datetime.fromisoformat(doc["timestamp"])
+            if ts < end and (ts > cursor or (ts == cursor and doc.get("audit_id") not in seen)):
+                out.append((line, doc.get("audit_id")))
+    return out
+
+
+async def _live_page(cursor: datetime, seen: set[Any], end: datetime) -> list[dict[str, Any]]:
+    """从游标 (cursor, 已导出的同时间戳 id) 起读取一页在线记录。"""
+    docs: list[dict[str, Any]] = []
+    it = get_storage().iter_audit(cursor, end, _READ_LINES)
+    try:
+        async for doc in it:
+            if doc["timestamp"] == cursor and _audit_id(doc["_id"]) in seen:
+                continue
+            docs.append(doc)
+            if len(docs) >= _READ_LINES:
+                break
+    finally:
+        await it.aclose()
+    return docs
+
+
+async def export_audit_logs(
+    start: datetime,
+    end: datetime,
+    archive_dir: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """
+    流式导出 [start, end) 的审计记录为 JSONL：先读与区间重叠的归档文件，再分页读存储中的在线记录。
+    逐批读取与产出，内存占用与区间大小无关；每条记录带 audit_id（存储中的 _id）。
+
+    共享锁只在读取 manifest 快照 / 增量与每页在线记录时短暂持有，慢速下载不会阻塞归档。
+    导出期间完成的归档批次在下一页前由 manifest 增量发现，其中位于在线读取游标之后的记录从文件补出，
+    既不漏读也不重复（补出的记录可能略晚于相邻的在线记录）。
+    中断的归档批次尚未补完时，其记录可能同时在文件与存储中，按文件中的 audit_id 跳过在线副本。
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    root = _archive_root(archive_dir)
+    async with _locked(root, exclusive=False):
+        manifest, offset = await asyncio.to_thread(_read_manifest_from, root, 0)
+        entries = sorted((e for e in manifest if _overlaps(e, start, end)), key=lambda e: (e["min_ts"], e["path"]))
+        # 未确认文件须在完整 manifest 上判定（commit 条目不在 entries 中），再限定到区间内的文件
+        in_range = {e["path"] for e in entries}
+        skip: set[Any] = set()
+        for e in _pending_files(manifest):
+            if e["path"] in in_range and (root / e["path"]).exists():
+                skip.update(await asyncio.to_thread(_read_audit_ids, root / e["path"]))
+
+    # 已登记的归档文件不再变化，无需持锁
+    for e in entries:
+        path = root / e["path"]
+        if not path.exists():
+            logger.warning("归档文件缺失，已跳过: %s", path)
+            continue
+        async for chunk in _iter_archive_file(path, start, end):
+            yield chunk
+
+    cursor, seen = start, set()  # 在线读取游标：已导出 timestamp < cursor 的记录及 cursor 上 id 在 seen 中的记录
+    while True:
+        async with _locked(root, exclusive=False):
+            added, offset = await asyncio.to_thread(_read_manifest_from, root, offset)
+            late: list[tuple[bytes, Any]] = []
+            for e in added:
+                if _overlaps(e, start, end) and (root / e["path"]).exists():
+                    late.extend(await asyncio.to_thread(_read_unexported, root / e["path"], cursor, seen, end))
+            docs = await _live_page(cursor, seen, end)
+        if late:
+            # 未确认的新文件中的记录可能仍在存储中，后续页跳过其在线副本
+            skip.update(audit_id for _, audit_id in late)
+            yield b"".join(line for line, _ in late)
+        if not docs:
+            break
+        last = docs[-1]["timestamp"]
+        if last != cursor:
+            cursor, seen = last, set()
+        seen.update(_audit_id(d["_id"]) for d in docs if d["timestamp"] == cursor)
+        kept = [_dumps(_to_record(d)) for d in docs if _audit_id(d["_id"]) not in skip]
+        if kept:
+            yield b"".join(kept)
+
+
+# ---------- 命令行：python -m services.archive_service --older-than-days 90 ----------
+
+
+async def _main(args: argparse.Namespace) -> None:
+    cutoff = naive_utc(datetime.fromisoformat(args.before)) if args.before else default_cutoff(args.older_than_days)
+    storage = get_storage()
+    await storage.connect()
+    try:
+        result = await archive_audit_logs(cutoff, args.archive_dir, args.batch_size)
+    finally:
+        await storage.close()
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def main() -> None:
+    from utils.logger import setup_logging
+
+    setup_logging()
+    parser = argparse.ArgumentParser(description="审计日志归档")
+    parser.add_argument("--before", default=None, help="截止时间（ISO 8601，UTC）")
+    parser.add_argument("--older-than-days", type=int, default=None, help="默认取 AUDIT_ARCHIVE_RETENTION_DAYS")
+    parser.add_argument("--archive-dir", default=None, help="默认取 AUDIT_ARCHIVE_DIR")
+    parser.add_argument("--batch-size", type=int, default=None, help="默认取 AUDIT_ARCHIVE_BATCH")
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,8 @@
 
 from typing import Optional
 
-from database import COLL_USERS, get_db
 from models import UserKeyInDB
+from storage import get_storage
 from utils.logger import get_logger
 
 logger = get_logger("auth_service")
@@ -16,13 +16,9 @@ async def get_user_by_api_key(api_key: str) -> Optional[UserKeyInDB]:
     """
     if not api_key or not api_key.strip():
         return None
-    db = get_db()
-    doc = await db[COLL_USERS].find_one(
-        {"api_key": api_key.strip(), "status": "active"},
-    )
+    doc = await get_storage().get_active_user(api_key.strip())
     if not doc:
         return None
-    doc.pop("_id", None)
     return UserKeyInDB(**doc)
 
 
@@ -0,0 +1,700 @@
+# services/batch_service.py - 离线批处理：JSONL 上传、后台并发执行、结果流式落盘
+
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import time
+import weakref
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Optional
+
+from config import get_settings
+from models import BatchAuditLogDoc, BatchJob, FileObject
+from services import audit_service, proxy_service
+from storage import get_storage
+from utils.logger import get_logger
+from utils.token_counter import count_tokens_sync, count_tokens_text_async
+
+logger = get_logger("batch_service")
+
+SUPPORTED_ENDPOINT = "/v1/chat/completions"
+_ACTIVE_STATUSES = ("validating", "in_progress", "finalizing", "cancelling")
+_READ_LINES = 200  # 每次从输入文件读取的行数
+_PROGRESS_EVERY = 100  # 每处理多少条 flush 结果文件并持久化计数（用量在每次扣账时落盘）
+_MAX_VALIDATION_ERRORS = 100
+
+# 进程实例 id：多 worker 共享 BATCH_DIR 时据此区分任务属主
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_jobs: dict[str, BatchJob] = {}  # 本进程内运行中的任务（实时计数）
+_tasks: dict[str, asyncio.Task] = {}
+_reclaimed: set[str] = set()  # 被其他进程判定为失联并回收的本进程任务
+# 按对象 id 串行化元数据写入；锁不再被引用时自动回收
+_save_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+_semaphore: asyncio.Semaphore | None = None
+_maintenance_task: asyncio.Task | None = None
+
+
+class BatchError(Exception):
+    """请求级错误，由路由转换为 OpenAI 规范错误体。"""
+
+    def __init__(self, code: str, message: str, status: int = 400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+
+@dataclass
+class _Run:
+    """单个任务运行期状态（不持久化）。"""
+
+    job: BatchJob
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    quota_exhausted: bool = False
+    # model -> [input_tokens, output_tokens, completed, failed]
+    usage: dict[str, list[int]] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """全局并发上限：所有任务共享 BATCH_CONCURRENCY 个在途上游请求。"""
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(max(1, get_settings().BATCH_CONCURRENCY))
+    return _semaphore
+
+
+# ---------- 元数据与文件路径 ----------
+
+
+def _root() -> Path:
+    return Path(get_settings().BATCH_DIR)
+
+
+def file_path(file_id: str) -> Path:
+    return _root() / "files" / f"{file_id}.jsonl"
+
+
+def _meta_path(kind: str, obj_id: str) -> Path:
+    return _root() / "meta" / kind / f"{obj_id}.json"
+
+
+def _marker_path(batch_id: str, kind: str) -> Path:
+    """跨进程标记：.cancel 为取消请求，.recover 为回收认领（O_EXCL 创建，只有一个进程能拿到）。"""
+    return _root() / "meta" / "batches" / f"{batch_id}.{kind}"
+
+
+def _create_marker(path: Path) -> bool:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
+
+
+def _write_meta(path: Path, data: str) -> None:
+    """每次写入使用独立的临时文件再原子改名，并发写同一元数据（含其他进程）不会互相移走临时文件。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _read_meta(path: Path) -> Optional[str]:
+    try:
+        return path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+async def _save(obj: FileObject | BatchJob) -> None:
+    """
+    同一对象的保存串行执行，并在持锁后才序列化：扣账、进度与心跳并发保存时，
+    后完成的写入总是最新状态，落盘的 used_tokens 不会被旧快照覆盖。
+    """
+    kind = "files" if isinstance(obj, FileObject) else "batches"
+    lock = _save_locks.setdefault(obj.id, asyncio.Lock())
+    async with lock:
+        if isinstance(obj, BatchJob) and obj.owner == INSTANCE_ID:
+            obj.heartbeat_at = int(time.time())
+        await asyncio.to_thread(_write_meta, _meta_path(kind, obj.id), obj.model_dump_json())
+
+
+async def _load_batch(batch_id: str) -> Optional[BatchJob]:
+    raw = await asyncio.to_thread(_read_meta, _meta_path("batches", batch_id))
+    return BatchJob.model_validate_json(raw) if raw is not None else None
+
+
+async def get_file(file_id: str, api_key: str) -> Optional[FileObject]:
+    """按 id 读取文件元数据；不存在或不属于该 api_key 时返回 None。"""
+    raw = await asyncio.to_thread(_read_meta, _meta_path("files", file_id))
+    if raw is None:
+        return None
+    doc = FileObject.model_validate_json(raw)
+    return doc if doc.api_key == api_key else None
+
+
+async def get_batch(batch_id: str, api_key: str) -> Optional[BatchJob]:
+    """按 id 读取任务；运行中的任务返回内存中的实时状态。"""
+    job = _jobs.get(batch_id)
+    if job is None:
+        job = await _load_batch(batch_id)
+        if job is None:
+            return None
+        # 其他进程执行中的任务：取消请求已登记但属主尚未处理时，对外显示 cancelling
+        if job.status in ("validating", "in_progress") and _marker_path(job.id, "cancel").exists():
+            job.status = "cancelling"
+    return job if job.api_key == api_key else None
+
+
+def _read_lines(fh: BinaryIO, n: int) -> list[bytes]:
+    lines = []
+    for _ in range(n):
+        line = fh.readline()
+        if not line:
+            break
+        lines.append(line)
+    return lines
+
+
+# ---------- 上传 ----------
+
+
+async def save_upload(
+    chunks: AsyncIterator[bytes],
+    filename: str,
+    purpose: str,
+    api_key: str,
+) -> FileObject:
+    """将请求体按块写入磁盘（不在内存中拼接），超过 BATCH_MAX_FILE_BYTES 时中止并删除。"""
+    if purpose != "batch":
+        raise BatchError("invalid_request_error", "purpose must be 'batch'")
+    max_bytes = get_settings().BATCH_MAX_FILE_BYTES
+    file_id = f"file-{uuid.uuid4().hex[:24]}"
+    path = file_path(file_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    size = 0
+    ok = False
+    fh = await asyncio.to_thread(open, path, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_bytes:
+                raise BatchError("invalid_request_error", f"file exceeds {max_bytes} bytes", status=413)
+            await asyncio.to_thread(fh.write, chunk)
+        ok = True
+    finally:
+        await asyncio.to_thread(fh.close)
+        if not ok:
+            path.unlink(missing_ok=True)
+    if size == 0:
+        path.unlink(missing_ok=True)
+        raise BatchError("invalid_request_error", "file is empty")
+    doc = FileObject(
+        id=file_id,
+        bytes=size,
+        created_at=int(time.time()),
+        filename=filename,
+        purpose=purpose,
+        api_key=api_key,
+    )
+    await _save(doc)
+    return doc
+
+
+# ---------- 任务管理 ----------
+
+
+async def create_batch(
+    input_file_id: str,
+    endpoint: str,
+    completion_window: str,
+    metadata: Optional[dict],
+    api_key: str,
+    user_name: str,
+) -> BatchJob:
+    """校验参数、登记任务并在后台启动执行。"""
+    if endpoint != SUPPORTED_ENDPOINT:
+        raise BatchError("invalid_request_error", f"endpoint must be {SUPPORTED_ENDPOINT}")
+    if completion_window != "24h":
+        raise BatchError("invalid_request_error", "completion_window must be '24h'")
+    f = await get_file(input_file_id, api_key)
+    if f is None or f.purpose != "batch":
+        raise BatchError("invalid_request_error", "input_file_id not found", status=404)
+    job = BatchJob(
+        id=f"batch_{uuid.uuid4().hex[:24]}",
+        endpoint=endpoint,
+        input_file_id=input_file_id,
+        completion_window=completion_window,
+        created_at=int(time.time()),
+        metadata=metadata,
+        api_key=api_key,
+        user_name=user_name,
+        owner=INSTANCE_ID,
+    )
+    await _save(job)
+    _jobs[job.id] = job
+    _tasks[job.id] = asyncio.create_task(_run_job(job))
+    return job
+
+
+async def cancel_batch(batch_id: str, api_key: str) -> Optional[BatchJob]:
+    """
+    请求取消：已完成的条目保留，未开始的条目不再执行。
+    任务由其他进程执行时写入 .cancel 标记，属主在下一次心跳时处理。
+    """
+    job = await get_batch(batch_id, api_key)
+    if job is None:
+        return None
+    if job.status not in ("validating", "in_progress"):
+        return job
+    if job.id in _jobs:
+        job.status = "cancelling"
+        await _save(job)
+    else:
+        await asyncio.to_thread(_create_marker, _marker_path(job.id, "cancel"))
+        job.status = "cancelling"
+    return job
+
+
+# ---------- 执行 ----------
+
+
+def _invalid_token_limit(body: dict) -> Optional[str]:
+    """max_tokens / max_completion_tokens 若出现必须是正整数；返回第一个不合法的字段名。"""
+    for key in ("max_completion_tokens", "max_tokens"):
+        v = body.get(key)
+        if v is not None and (isinstance(v, bool) or not isinstance(v, int) or v <= 0):
+            return key
+    return None
+
+
+def _scan_input(path: Path, output_reserve: int, encoding: str, max_requests: int) -> tuple[int, int, list[dict]]:
+    """
+    逐行校验输入并估算需预留的 token（input 估算 + max_tokens 或默认 output 预留）。
+    返回 (请求数, 预留 token, 错误列表)。
+    """
+    total = 0
+    reserve = 0
+    errors: list[dict] = []
+    custom_ids: set[str] = set()
+    use_tiktoken = True
+
+    def _estimate(messages: list) -> int:
+        nonlocal use_tiktoken
+        if use_tiktoken:
+            try:
+                return count_tokens_sync(messages, encoding)
+            except Exception as e:
+                logger.warning("批处理 token 估算回退为按字节估算: %s", e)
+                use_tiktoken = False
+        return len(json.dumps(messages, ensure_ascii=False)) // 4
+
+    with open(path, "rb") as fh:
+        for lineno, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                errors.append({"code": "invalid_json_line", "message": "line is not valid JSON", "line": lineno})
+                continue
+            body = item.get("body") if isinstance(item, dict) else None
+            custom_id = item.get("custom_id") if isinstance(item, dict) else None
+            if not isinstance(custom_id, str) or not custom_id:
+                errors.append({"code": "missing_required_parameter", "message": "custom_id is required", "line": lineno})
+            elif custom_id in custom_ids:
+                errors.append({"code": "duplicate_custom_id", "message": f"duplicate custom_id {custom_id}", "line": lineno})
+            elif item.get("url") != SUPPORTED_ENDPOINT or item.get("method", "POST") != "POST":
+                errors.append({"code": "invalid_url", "message": f"url must be POST {SUPPORTED_ENDPOINT}", "line": lineno})
+            elif not isinstance(body, dict) or not isinstance(body.get("messages"), list) or not body["messages"]:
+                errors.append({"code": "invalid_request", "message": "body.messages is required", "line": lineno})
+            elif (bad := _invalid_token_limit(body)) is not None:
+                errors.append({"code": "invalid_request", "message": f"body.{bad} must be a positive integer", "line": lineno})
+            else:
+                custom_ids.add(custom_id)
+                total += 1
+                if total > max_requests:
+                    errors.append({"code": "too_many_requests", "message": f"batch exceeds {max_requests} requests", "line": lineno})
+                    break
+                out = body.get("max_completion_tokens") or body.get("max_tokens") or output_reserve
+                reserve += _estimate(body["messages"]) + out
+            if len(errors) >= _MAX_VALIDATION_ERRORS:
+                break
+    if total == 0 and not errors:
+        errors.append({"code": "empty_file", "message": "input file has no requests", "line": None})
+    return total, reserve, errors
+
+
+async def _run_item(item: dict) -> tuple[dict, bool, str, int, int]:
+    """执行单条请求，返回 (输出记录, 是否成功, model, input_tokens, output_tokens)。"""
+    body = item["body"]
+    messages = body["messages"]
+    model = body.get("model") or get_settings().LLM_MODEL
+    record: dict[str, Any] = {"id": f"batch_req_{uuid.uuid4().hex[:24]}", "custom_id": item["custom_id"]}
+    try:
+        collected_content: list[str] = []
+        usage: dict[str, int] = {}
+        last: dict = {}
+        async for chunk in proxy_service.stream_completion(
+            messages=messages,
+            model=model,
+            stream=True,
+            **{k: v for k, v in body.items() if k not in ("messages", "model", "stream", "stream_options")},
+        ):
+            last = chunk
+            proxy_service.apply_chunk(chunk, collected_content, usage)
+        input_tokens = usage.get("input_tokens")
+        output_tokens = usage.get("output_tokens")
+        if input_tokens is None:
+            try:
+                input_tokens = await proxy_service.estimate_input_tokens(messages)
+            except Exception as e:
+                logger.warning("批处理 estimate_input_tokens 失败: %s", e)
+                input_tokens = 0
+        if output_tokens is None:
+            output_tokens = await count_tokens_text_async("".join(collected_content))
+    except Exception as e:
+        logger.warning("批处理条目失败 custom_id=%s: %s", item["custom_id"], e)
+        record.update(response=None, error={"code": "api_error", "message": str(e)})
+        return record, False, model, 0, 0
+    resp = proxy_service.build_completion_response(
+        last, model, "".join(collected_content), input_tokens, output_tokens
+    )
+    record.update(response={"status_code": 200, "request_id": resp["id"], "body": resp}, error=None)
+    return record, True, model, input_tokens, output_tokens
+
+
+async def _charge(run: _Run, tokens: int) -> None:
+    """
+    累计用量并立即持久化，崩溃恢复时按落盘的 used_tokens 结算，不会多退；
+    超出预留时按缺口追加预留，追加失败则后续条目以 insufficient_quota 失败。
+    """
+    job = run.job
+    async with run.lock:
+        job.used_tokens += tokens
+        if job.used_tokens > job.reserved_tokens and not run.quota_exhausted:
+            s = get_settings()
+            extra = job.used_tokens - job.reserved_tokens + s.BATCH_OUTPUT_RESERVE * s.BATCH_CONCURRENCY
+            if await get_storage().deduct_tokens(job.api_key, extra):
+                job.reserved_tokens += extra
+            else:
+                run.quota_exhausted = True
+                logger.warning("批处理余额不足，停止执行剩余条目: batch_id=%s", job.id)
+        await _save(job)
+
+
+async def _process(run: _Run, input_path: Path, out_path: Path, err_path: Path) -> None:
+    """生产者按块读输入，worker 并发执行；结果逐行写入文件，队列有界，内存占用与批大小无关。"""
+    job = run.job
+    workers = max(1, get_settings().BATCH_CONCURRENCY)
+    queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=workers * 2)
+    out_f = await asyncio.to_thread(open, out_path, "wb")
+    err_f = await asyncio.to_thread(open, err_path, "wb")
+    processed = 0
+
+    async def _producer() -> None:
+        fh = await asyncio.to_thread(open, input_path, "rb")
+        try:
+            while job.status != "cancelling":
+                lines = await asyncio.to_thread(_read_lines, fh, _READ_LINES)
+                if not lines:
+                    break
+                for line in lines:
+                    if line.strip():
+                        await queue.put(line)
+        finally:
+            await asyncio.to_thread(fh.close)
+            for _ in range(workers):
+                await queue.put(None)
+
+    async def _worker() -> None:
+        nonlocal processed
+        while (line := await queue.get()) is not None:
+            if job.status == "cancelling":
+                continue
+            item = json.loads(line)
+            if run.quota_exhausted:
+                record: dict[str, Any] = {
+                    "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                    "custom_id": item["custom_id"],
+                    "response": None,
+                    "error": {"code": "insufficient_quota", "message": "Insufficient balance. Please recharge your account."},
+                }
+                ok, model, input_tokens, output_tokens = False, item["body"].get("model") or get_settings().LLM_MODEL, 0, 0
+            else:
+                async with _get_semaphore():
+                    record, ok, model, input_tokens, output_tokens = await _run_item(item)
+            if ok:
+                await _charge(run, input_tokens + output_tokens)
+            # 行级写入落在缓冲区，进度持久化时统一 flush
+            (out_f if ok else err_f).write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            agg = run.usage.setdefault(model, [0, 0, 0, 0])
+            agg[0] += input_tokens
+            agg[1] += output_tokens
+            agg[2 if ok else 3] += 1
+            job.request_counts["completed" if ok else "failed"] += 1
+            processed += 1
+            if processed % _PROGRESS_EVERY == 0:
+                await asyncio.to_thread(out_f.flush)
+                await asyncio.to_thread(err_f.flush)
+                await _save(job)
+
+    try:
+        # 任一协程异常时 TaskGroup 取消其余协程，避免生产者阻塞在满队列上
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(_producer())
+            for _ in range(workers):
+                tg.create_task(_worker())
+    finally:
+        await asyncio.to_thread(out_f.close)
+        await asyncio.to_thread(err_f.close)
+
+
+async def _register_output(path: Path, purpose: str, filename: str, api_key: str) -> Optional[str]:
+    """为非空结果文件登记元数据并返回 file_id；空文件直接删除。"""
+    size = path.stat().st_size if path.exists() else 0
+    if size == 0:
+        path.unlink(missing_ok=True)
+        return None
+    doc = FileObject(
+        id=path.stem,
+        bytes=size,
+        created_at=int(time.time()),
+        filename=filename,
+        purpose=purpose,
+        api_key=api_key,
+    )
+    await _save(doc)
+    return doc.id
+
+
+def _fail(job: BatchJob, errors: list[dict]) -> None:
+    job.status = "failed"
+    job.failed_at = int(time.time())
+    job.errors = {"object": "list", "data": errors}
+
+
+async def _settle(run: _Run) -> None:
+    """结算：退还未用完的预留（或补扣超出部分），并按模型写聚合审计。"""
+    job = run.job
+    diff = job.reserved_tokens - job.used_tokens
+    if diff > 0:
+        await get_storage().add_tokens(job.api_key, diff)
+    elif diff < 0 and not await get_storage().deduct_tokens(job.api_key, -diff):
+        logger.warning("批处理补扣失败: batch_id=%s 缺口=%s", job.id, -diff)
+    job.reserved_tokens = job.used_tokens
+    duration_ms = (time.perf_counter() - run.started) * 1000
+    for model, (input_tokens, output_tokens, completed, failed) in run.usage.items():
+        await audit_service.write_audit_log(
+            BatchAuditLogDoc(
+                api_key=job.api_key[:8] + "***",
+                user_id=job.user_name,
+                model=model,
+                input_tokens=input_tokens,
+                output_tokens=output_tokens,
+                total_tokens=input_tokens + output_tokens,
+                duration_ms=duration_ms,
+                status_code=200 if completed else 500,
+                batch_id=job.id,
+                request_count=completed,
+                failed_count=failed,
+            )
+        )
+
+
+async def _reclaimed_on_disk(job_id: str) -> Optional[BatchJob]:
+    """若任务已被其他进程回收（.recover 标记存在且元数据已落为 failed），返回回收后的元数据。"""
+    if not await asyncio.to_thread(_marker_path(job_id, "recover").exists):
+        return None
+    disk = await _load_batch(job_id)
+    return disk if disk is not None and disk.status == "failed" else None
+
+
+async def _adopt_reclaim(job: BatchJob) -> None:
+    """回收方已按当时的 used_tokens 退款：以回收后的预留为准，结算时只补扣此后的用量，避免重复退款。"""
+    disk = await _reclaimed_on_disk(job.id)
+    if disk is not None:
+        _reclaimed.add(job.id)
+        job.reserved_tokens = disk.reserved_tokens
+
+
+async def _run_job(job: BatchJob) -> None:
+    """validating → 一次性预留余额 → in_progress → finalizing → completed / cancelled / failed。"""
+    s = get_settings()
+    run = _Run(job=job)
+    input_path = file_path(job.input_file_id)
+    try:
+        total, reserve, errors = await asyncio.to_thread(
+            _scan_input, input_path, s.BATCH_OUTPUT_RESERVE, s.TIKTOKEN_ENCODING, s.BATCH_MAX_REQUESTS
+        )
+        job.request_counts["total"] = total
+        if errors:
+            _fail(job, errors)
+            return
+        if job.status == "cancelling":
+            job.status = "cancelled"
+            job.cancelled_at = int(time.time())
+            return
+        if not await get_storage().deduct_tokens(job.api_key, reserve):
+            _fail(job, [{"code": "insufficient_quota", "message": f"Insufficient balance: batch requires {reserve} tokens.", "line": None}])
+            return
+        job.reserved_tokens = reserve
+        # 预留期间到达的取消：不进入 in_progress，预留由 finally 中的结算全额退还
+        if job.status == "cancelling":
+            job.status = "cancelled"
+            job.cancelled_at = int(time.time())
+            return
+        job.status = "in_progress"
+        job.in_progress_at = int(time.time())
+        await _save(job)
+
+        out_path = file_path(f"file-{uuid.uuid4().hex[:24]}")
+        err_path = file_path(f"file-{uuid.uuid4().hex[:24]}")
+        await _process(run, input_path, out_path, err_path)
+
+        if job.status != "cancelling":
+            job.status = "finalizing"
+        job.finalizing_at = int(time.time())
+        await _save(job)
+        job.output_file_id = await _register_output(out_path, "batch_output", f"{job.id}_output.jsonl", job.api_key)
+        job.error_file_id = await _register_output(err_path, "batch_output", f"{job.id}_errors.jsonl", job.api_key)
+        if job.status == "cancelling":
+            job.status = "cancelled"
+            job.cancelled_at = int(time.time())
+        else:
+            job.status = "completed"
+            job.completed_at = int(time.time())
+    except asyncio.CancelledError:
+        if job.id in _reclaimed:
+            _fail(job, [{"code": "interrupted", "message": "batch reclaimed after missed heartbeats", "line": None}])
+        else:
+            _fail(job, [{"code": "interrupted", "message": "batch interrupted by server shutdown", "line": None}])
+        raise
+    except Exception as e:
+        logger.exception("批处理任务失败 batch_id=%s: %s", job.id, e)
+        _fail(job, [{"code": "internal_error", "message": str(e), "line": None}])
+    finally:
+        try:
+            await _adopt_reclaim(job)
+            await _settle(run)
+        finally:
+            await _save(job)
+            _jobs.pop(job.id, None)
+            _tasks.pop(job.id, None)
+            _reclaimed.discard(job.id)
+            logger.info(
+                "批处理任务结束 batch_id=%s status=%s counts=%s used_tokens=%s",
+                job.id, job.status, job.request_counts, job.used_tokens,
+            )
+
+
+# ---------- 生命周期 ----------
+
+
+def _list_batch_meta() -> list[str]:
+    d = _root() / "meta" / "batches"
+    if not d.exists():
+        return []
+    return [p.read_text(encoding="utf-8") for p in d.glob("*.json")]
+
+
+def _is_stale(job: BatchJob) -> bool:
+    return job.heartbeat_at < time.time() - get_settings().BATCH_STALE_S
+
+
+async def recover_interrupted() -> int:
+    """
+    回收属主已退出的任务：心跳超过 BATCH_STALE_S 未刷新的活动任务，
+    由先创建 .recover 标记的进程退还未消费的预留并标记为 failed。返回处理数。
+    """
+    count = 0
+    for raw in await asyncio.to_thread(_list_batch_meta):
+        job = BatchJob.model_validate_json(raw)
+        if job.status not in _ACTIVE_STATUSES or job.id in _jobs or not _is_stale(job):
+            continue
+        if not await asyncio.to_thread(_create_marker, _marker_path(job.id, "recover")):
+            continue
+        # 认领后重读，排除认领前属主刚好刷新了心跳的情况
+        marker = _marker_path(job.id, "recover")
+        job = await _load_batch(job.id)
+        if job is None or job.status not in _ACTIVE_STATUSES or not _is_stale(job):
+            await asyncio.to_thread(marker.unlink, True)
+            continue
+        # used_tokens 每次扣账即落盘，退还额即未消费的预留
+        refund = job.reserved_tokens - job.used_tokens
+        if refund > 0:
+            await get_storage().add_tokens(job.api_key, refund)
+        job.reserved_tokens = job.used_tokens
+        _fail(job, [{"code": "interrupted", "message": "batch owner stopped responding", "line": None}])
+        await _save(job)
+        count += 1
+    if count:
+        logger.warning("已回收中断的批处理任务: %s 个", count)
+    return count
+
+
+async def _heartbeat() -> None:
+    """刷新本进程任务的心跳，处理其他进程登记的取消请求，并发现被误回收的任务。"""
+    for job_id, job in list(_jobs.items()):
+        if await _reclaimed_on_disk(job_id) is not None:
+            logger.warning("批处理任务已被其他进程回收，停止执行: batch_id=%s", job_id)
+            _reclaimed.add(job_id)
+            task = _tasks.get(job_id)
+            if task is not None:
+                task.cancel()
+            continue
+        if job.status in ("validating", "in_progress") and await asyncio.to_thread(
+            _marker_path(job_id, "cancel").exists
+        ):
+            job.status = "cancelling"
+        await _save(job)
+
+
+async def _maintenance_loop() -> None:
+    s = get_settings()
+    last_sweep = time.monotonic()
+    while True:
+        await asyncio.sleep(s.BATCH_HEARTBEAT_S)
+        try:
+            await _heartbeat()
+            if time.monotonic() - last_sweep >= s.BATCH_STALE_S:
+                last_sweep = time.monotonic()
+                await recover_interrupted()
+        except Exception as e:
+            logger.exception("批处理维护循环出错: %s", e)
+
+
+async def start() -> None:
+    """启动时回收失联任务，并开始心跳 / 回收循环。"""
+    global _maintenance_task
+    try:
+        await recover_interrupted()
+    except Exception as e:
+        logger.exception("回收中断的批处理任务失败: %s", e)
+    if _maintenance_task is None:
+        _maintenance_task = asyncio.create_task(_maintenance_loop())
+
+
+async def shutdown() -> None:
+    """停止维护循环并取消运行中的任务；任务自身在 finally 中结算并落盘状态。"""
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        _maintenance_task = None
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,7 +1,6 @@
-# services/billing_service.py - 余额预检与原子扣除（$inc）
+# services/billing_service.py - 余额预检与原子扣除
 
-from database import COLL_USERS, get_db
-from models import UserKeyInDB
+from storage import get_storage
 from utils.logger import get_logger
 
 logger = get_logger("billing_service")
@@ -9,41 +8,18 @@ logger = get_logger("billing_service")
 
 async def check_balance(api_key: str, required_tokens: int) -> bool:
     """检查用户当前余额是否 >= required_tokens。"""
-    db = get_db()
-    doc = await db[COLL_USERS].find_one(
-        {"api_key": api_key, "status": "active"},
-        projection={"balance_tokens": 1},
-    )
-    if not doc:
+    balance = await get_storage().get_balance(api_key)
+    if balance is None:
         return False
-    return (doc.get("balance_tokens") or 0) >= required_tokens
+    return balance >= required_tokens
 
 
 async def deduct_tokens(api_key: str, tokens: int) -> bool:
     """
-    使用 $inc 原子扣除余额。
-    若扣除后余额为负，则不执行并返回 False；否则返回 True。
-    通过 find_one_and_update 的原子性保证并发安全。
+    原子扣除余额。
+    若余额不足或 Key 无效则不扣并返回 False；否则返回 True。
+    原子性由存储后端保证（Mongo 为 $inc + 回滚，SQLite 为条件 UPDATE）。
     """
     if tokens <= 0:
         return True
-    db = get_db()
-    # 先扣减，再检查结果；若余额不足则用 $max 保证不为负（或先查再扣，这里用条件更新）
-    result = await db[COLL_USERS].find_one_and_update(
-        {"api_key": api_key, "status": "active"},
-        {"$inc": {"balance_tokens": -tokens}},
-        return_document=True,
-        projection={"balance_tokens": 1},
-    )
-    if not result:
-        return False
-    new_balance = result.get("balance_tokens", 0)
-    if new_balance < 0:
-        # 回滚：加回已扣的
-        await db[COLL_USERS].update_one(
-            {"api_key": api_key},
-            {"$inc": {"balance_tokens": tokens}},
-        )
-        logger.warning("余额不足已回滚: api_key=%s, 尝试扣除=%s", api_key[:8] + "***", tokens)
-        return False
-    return True
+    return await get_storage().deduct_tokens(api_key, tokens)
@@ -1,11 +1,11 @@
 # services/proxy_service.py - 通过 LiteLLM 调用后端并支持流式与计费
 
+import asyncio
+import importlib
 import json
-import time
 from typing import Any, AsyncIterator
 
-import litellm
-from litellm import acompletion
+import httpx
 
 from config import get_settings
 from utils.logger import get_logger
@@ -13,6 +13,76 @@ from utils.token_counter import count_tokens_async
 
 logger = get_logger("proxy_service")
 
+# litellm 导入耗时数秒，延迟到 warmup 或首个请求时加载
+_litellm: Any = None
+_litellm_import: asyncio.Future | None = None  # 进行中的导入，所有调用方共享，避免多个线程同时导入
+_http_client: httpx.AsyncClient | None = None
+
+
+def _import_litellm() -> Any:
+    """导入 litellm（同步，耗时数秒），只应在线程池中调用。"""
+    global _litellm
+    if _litellm is None:
+        _litellm = importlib.import_module("litellm")
+    return _litellm
+
+
+def _attach_pool() -> None:
+    """litellm 与连接池都就绪后，将连接池交给 litellm（aclient_session）；只在事件循环线程调用。"""
+    if _litellm is not None and _http_client is not None:
+        _litellm.aclient_session = _http_client
+
+
+async def _get_litellm() -> Any:
+    """
+    懒加载 litellm：导入放在线程池，不阻塞事件循环。并发调用方等待同一次导入；
+    shield 保证调用方超时取消时导入线程的结果仍被保留，不会再起一个线程重复导入。
+    """
+    global _litellm_import
+    if _litellm is None:
+        if _litellm_import is None or (
+            _litellm_import.done() and (_litellm_import.cancelled() or _litellm_import.exception() is not None)
+        ):
+            _litellm_import = asyncio.get_running_loop().run_in_executor(None, _import_litellm)
+        await asyncio.shield(_litellm_import)
+    _attach_pool()
+    return _litellm
+
+
+async def warmup_litellm() -> None:
+    """预热步骤：导入 litellm，并挂上已建立的连接池。"""
+    await _get_litellm()
+
+
+async def open_upstream_pool() -> None:
+    """
+    创建共享 httpx 连接池并向上游发一次轻量请求，提前完成 DNS / TCP / TLS 握手。
+    不依赖 litellm，可与其导入并行；两者先后完成时由 _attach_pool 挂接。
+    """
+    global _http_client
+    if _http_client is None:
+        s = get_settings()
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=s.UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=s.UPSTREAM_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+            follow_redirects=True,
+        )
+        _attach_pool()
+    # 任意状态码都说明连接已建立；网络错误向上抛出，由调用方决定是否重试
+    await _http_client.get(get_settings().LLM_ENDPOINT.rstrip("/") + "/")
+
+
+async def close_upstream_pool() -> None:
+    global _http_client
+    if _http_client is not None:
+        if _litellm is not None and _litellm.aclient_session is _http_client:
+            _litellm.aclient_session = None
+        await _http_client.aclose()
+        _http_client = None
+
 
 def _get_litellm_model() -> str:
     """返回 LiteLLM 使用的 Azure 模型名。"""
@@ -59,7 +129,8 @@ async def stream_completion(
     if stream:
         all_kw.setdefault("stream_options", {})["include_usage"] = True
 
-    response = await acompletion(**all_kw)
+    litellm = await _get_litellm()
+    response = await litellm.acompletion(**all_kw)
     async for chunk in response:
         if hasattr(chunk, "model_dump"):
             c = chunk.model_dump()
@@ -70,6 +141,47 @@ async def stream_completion(
         yield c
 
 
+def apply_chunk(chunk: dict, collected_content: list[str], usage: dict[str, int]) -> None:
+    """从一个 chunk 中收集 delta content，并在出现 usage 时记录 input/output token。"""
+    choices = chunk.get("choices") or []
+    if choices and isinstance(choices[0], dict):
+        delta = (choices[0] or {}).get("delta") or {}
+        if isinstance(delta, dict) and delta.get("content"):
+            collected_content.append(delta["content"])
+        # 流式末尾可能带 usage
+        u = (choices[0] or {}).get("usage") or chunk.get("usage")
+        if u and isinstance(u, dict):
+            usage["input_tokens"] = u.get("input_tokens") or u.get("prompt_tokens") or 0
+            usage["output_tokens"] = u.get("output_tokens") or u.get("completion_tokens") or 0
+
+
+def build_completion_response(
+    last_chunk: dict,
+    model: str,
+    content: str,
+    input_tokens: int,
+    output_tokens: int,
+) -> dict:
+    """将收集到的流式结果合并为一条 OpenAI chat.completion 响应。"""
+    return {
+        "id": last_chunk.get("id", "chatcmpl-bridge"),
+        "object": "chat.completion",
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": input_tokens,
+            "completion_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
 def build_sse_line(data: dict) -> str:
     """将一条 JSON 转为 SSE 行：data: {...}\n\n"""
     return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
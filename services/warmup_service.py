@@ -0,0 +1,112 @@
+# services/warmup_service.py - 启动预热（并行）与就绪状态
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from config import get_settings
+from services import proxy_service
+from storage import get_storage
+from utils.logger import get_logger
+from utils.token_counter import warmup_encoding
+
+logger = get_logger("warmup_service")
+
+# 步骤名 -> {"ok": bool, "ms": float, "error": str | None}
+_status: dict[str, dict[str, Any]] = {}
+_tasks: dict[str, asyncio.Task] = {}
+_retry_task: asyncio.Task | None = None
+
+
+async def _warmup_encoder() -> None:
+    """
+    litellm 导入时也会导入 tiktoken；两个线程同时导入会触发模块锁死锁检测（_DeadlockError），
+    因此编码加载等 litellm 导入完成后再执行。存储连接与上游连接池属于 I/O，仍与导入并行。
+    """
+    await proxy_service.warmup_litellm()
+    await warmup_encoding(get_settings().TIKTOKEN_ENCODING)
+
+
+def _steps() -> dict[str, Callable[[], Awaitable[None]]]:
+    return {
+        "litellm": proxy_service.warmup_litellm,
+        "storage": get_storage().connect,
+        "encoder": _warmup_encoder,
+        "upstream_pool": proxy_service.open_upstream_pool,
+    }
+
+
+async def _run_step(name: str, fn: Callable[[], Awaitable[None]]) -> None:
+    start = time.perf_counter()
+    try:
+        await fn()
+    except Exception as e:
+        _status[name] = {"ok": False, "ms": (time.perf_counter() - start) * 1000, "error": repr(e)}
+        logger.warning("预热步骤失败 %s: %s", name, e)
+        return
+    _status[name] = {"ok": True, "ms": (time.perf_counter() - start) * 1000, "error": None}
+
+
+def _start(name: str, fn: Callable[[], Awaitable[None]]) -> None:
+    _status.setdefault(name, {"ok": False, "ms": 0.0, "error": "pending"})
+    _tasks[name] = asyncio.create_task(_run_step(name, fn))
+
+
+async def _retry_loop(steps: dict[str, Callable[[], Awaitable[None]]]) -> None:
+    """重跑失败的步骤直到全部就绪；间隔从 WARMUP_RETRY_INTERVAL_S 起翻倍，上限 60 秒。"""
+    interval = get_settings().WARMUP_RETRY_INTERVAL_S
+    while not is_ready():
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, 60.0)
+        for name, fn in steps.items():
+            if not _status[name]["ok"] and _tasks[name].done():
+                _start(name, fn)
+    logger.info("预热重试完成，服务已就绪")
+
+
+def is_ready() -> bool:
+    return bool(_status) and all(st["ok"] for st in _status.values())
+
+
+def status() -> dict[str, dict[str, Any]]:
+    return {name: dict(st) for name, st in _status.items()}
+
+
+async def warmup(import_ms: float | None = None) -> dict[str, dict[str, Any]]:
+    """
+    并行执行：导入 litellm（随后加载 tiktoken 编码）、连接存储并 ping、建立上游连接池。
+    最多等待 WARMUP_TIMEOUT_S；超时或失败的步骤转入后台重试，/readyz 在全部成功前返回 503。
+    """
+    global _retry_task
+    start = time.perf_counter()
+    steps = _steps()
+    for name, fn in steps.items():
+        _start(name, fn)
+    _, pending = await asyncio.wait(_tasks.values(), timeout=get_settings().WARMUP_TIMEOUT_S)
+    for name, task in _tasks.items():
+        if task in pending:
+            _status[name]["error"] = "timeout"
+    total_ms = (time.perf_counter() - start) * 1000
+
+    breakdown = " | ".join(
+        f"{name}={st['ms']:.1f} ms{'' if st['ok'] else ' (' + str(st['error']) + ')'}"
+        for name, st in _status.items()
+    )
+    import_part = f"import={import_ms:.1f} ms | " if import_ms is not None else ""
+    logger.info("启动预热 %s | %swarmup=%.1f ms | %s", "完成" if is_ready() else "未完成", import_part, total_ms, breakdown)
+
+    if not is_ready():
+        _retry_task = asyncio.create_task(_retry_loop(steps))
+    return status()
+
+
+async def shutdown() -> None:
+    """停止重试并释放上游连接池与存储后端。"""
+    global _retry_task
+    if _retry_task is not None:
+        _retry_task.cancel()
+        _retry_task = None
+    for task in _tasks.values():
+        task.cancel()
+    await proxy_service.close_upstream_pool()
+    await get_storage().close()
@@ -0,0 +1,43 @@
+# storage 包：可插拔存储后端（mongo / sqlite / memory）
+
+from config import get_settings
+from storage.base import Storage
+from utils.logger import get_logger
+
+logger = get_logger("storage")
+
+_storage: Storage | None = None
+
+
+def create_storage(backend: str) -> Storage:
+    """按名称构建后端实例；未知名称抛 ValueError。"""
+    backend = (backend or "").strip().lower()
+    if backend == "mongo":
+        from storage.mongo import MongoStorage
+        return MongoStorage()
+    if backend == "sqlite":
+        from storage.sqlite import SQLiteStorage
+        s = get_settings()
+        return SQLiteStorage(s.SQLITE_PATH, s.SQLITE_COMMIT_BATCH, s.SQLITE_COMMIT_INTERVAL_MS)
+    if backend == "memory":
+        from storage.memory import MemoryStorage
+        return MemoryStorage()
+    raise ValueError(f"未知 STORAGE_BACKEND: {backend!r}（可选 mongo / sqlite / memory）")
+
+
+def get_storage() -> Storage:
+    """进程级单例，后端由 STORAGE_BACKEND 决定。"""
+    global _storage
+    if _storage is None:
+        _storage = create_storage(get_settings().STORAGE_BACKEND)
+        logger.info("存储后端: %s", _storage.name)
+    return _storage
+
+
+def set_storage(storage: Storage | None) -> None:
+    """替换进程级后端（测试 / 压测注入用）；传 None 则下次按配置重建。"""
+    global _storage
+    _storage = storage
+
+
+__all__ = ["Storage", "create_storage", "get_storage", "set_storage"]
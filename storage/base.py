@@ -0,0 +1,82 @@
+# storage/base.py - 存储后端接口：Key 查询、余额扣减、审计追加、Key 管理
+
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+
+
+class Storage(ABC):
+    """
+    auth / billing / audit 与管理端共用的存储抽象。
+    用户文档字段与 UserKeyInDB 一致；审计文档字段与 AuditLogDoc 一致。
+    """
+
+    name: str = ""
+
+    # ---------- 生命周期 ----------
+
+    async def connect(self) -> None:
+        """建立连接 / 建表；默认无操作。"""
+
+    async def flush(self) -> None:
+        """立即落盘未提交的写入；默认无操作。"""
+
+    async def close(self) -> None:
+        """释放连接并落盘未提交的写入；默认无操作。"""
+
+    # ---------- Key 查询 ----------
+
+    @abstractmethod
+    async def get_active_user(self, api_key: str) -> Optional[dict[str, Any]]:
+        """返回 status=active 的用户文档；不存在或已冻结返回 None。"""
+
+    @abstractmethod
+    async def get_balance(self, api_key: str) -> Optional[int]:
+        """返回 active 用户的余额；不存在或已冻结返回 None。"""
+
+    # ---------- 预留 / 扣减 ----------
+
+    @abstractmethod
+    async def deduct_tokens(self, api_key: str, tokens: int) -> bool:
+        """原子扣减余额；余额不足或 Key 无效时不扣并返回 False。"""
+
+    @abstractmethod
+    async def add_tokens(self, api_key: str, tokens: int) -> bool:
+        """原子增加余额（退还预留等）；Key 不存在返回 False。"""
+
+    # ---------- 审计 ----------
+
+    @abstractmethod
+    async def append_audit(self, doc: dict[str, Any]) -> None:
+        """追加一条审计文档。"""
+
+    @abstractmethod
+    async def fetch_audit_before(self, cutoff: datetime, limit: int) -> list[dict[str, Any]]:
+        """按 timestamp 升序取最多 limit 条早于 cutoff 的审计文档（含 _id，供归档后删除）。"""
+
+    @abstractmethod
+    async def delete_audit(self, ids: list[Any]) -> int:
+        """按 _id 批量删除审计文档，返回删除条数；ids 也可以是归档文件中的 audit_id（非整数 _id 的字符串形式）。"""
+
+    @abstractmethod
+    def iter_audit(self, start: datetime, end: datetime, batch_size: int = 1000) -> AsyncIterator[dict[str, Any]]:
+        """按 timestamp 升序流式读取 [start, end) 的审计文档（含 _id），每批最多 batch_size 条。"""
+
+    # ---------- Key 管理 ----------
+
+    @abstractmethod
+    async def create_key(self, doc: dict[str, Any]) -> bool:
+        """创建 Key；api_key 已存在时返回 False。"""
+
+    @abstractmethod
+    async def list_keys(self) -> list[dict[str, Any]]:
+        """列出所有 Key（api_key, user_name, balance_tokens, status, created_at）。"""
+
+    @abstractmethod
+    async def update_key(
+        self,
+        api_key: str,
+        balance_inc: Optional[int] = None,
+        status: Optional[str] = None,
+    ) -> tuple[int, int]:
+        """充值（累加）和/或修改状态，返回 (matched, modified)。"""
@@ -0,0 +1,96 @@
+# storage/memory.py - 进程内存储后端：用于测试、压测与无状态单机部署
+
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+
+from storage.base import Storage
+
+_KEY_FIELDS = ("api_key", "user_name", "balance_tokens", "status", "created_at")
+
+
+class MemoryStorage(Storage):
+    """
+    dict + list 实现；所有方法在单个事件循环内无 await 点，天然原子。
+    进程退出即丢失数据。
+    """
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self.users: dict[str, dict[str, Any]] = {}
+        self.audit_logs: list[dict[str, Any]] = []
+        self._next_audit_id = 0
+
+    def _active(self, api_key: str) -> Optional[dict[str, Any]]:
+        doc = self.users.get(api_key)
+        if doc is None or doc.get("status") != "active":
+            return None
+        return doc
+
+    async def get_active_user(self, api_key: str) -> Optional[dict[str, Any]]:
+        doc = self._active(api_key)
+        return dict(doc) if doc is not None else None
+
+    async def get_balance(self, api_key: str) -> Optional[int]:
+        doc = self._active(api_key)
+        return (doc.get("balance_tokens") or 0) if doc is not None else None
+
+    async def deduct_tokens(self, api_key: str, tokens: int) -> bool:
+        doc = self._active(api_key)
+        if doc is None or (doc.get("balance_tokens") or 0) < tokens:
+            return False
+        doc["balance_tokens"] = (doc.get("balance_tokens") or 0) - tokens
+        return True
+
+    async def add_tokens(self, api_key: str, tokens: int) -> bool:
+        doc = self.users.get(api_key)
+        if doc is None:
+            return False
+        doc["balance_tokens"] = (doc.get("balance_tokens") or 0) + tokens
+        return True
+
+    async def append_audit(self, doc: dict[str, Any]) -> None:
+        self._next_audit_id += 1
+        self.audit_logs.append({**doc, "_id": self._next_audit_id})
+
+    async def fetch_audit_before(self, cutoff: datetime, limit: int) -> list[dict[str, Any]]:
+        docs = sorted((d for d in self.audit_logs if d["timestamp"] < cutoff), key=lambda d: d["timestamp"])
+        return [dict(d) for d in docs[:limit]]
+
+    async def delete_audit(self, ids: list[Any]) -> int:
+        drop = set(ids)
+        before = len(self.audit_logs)
+        self.audit_logs = [d for d in self.audit_logs if d["_id"] not in drop]
+        return before - len(self.audit_logs)
+
+    async def iter_audit(self, start: datetime, end: datetime, batch_size: int = 1000) -> AsyncIterator[dict[str, Any]]:
+        docs = sorted((d for d in self.audit_logs if start <= d["timestamp"] < end), key=lambda d: d["timestamp"])
+        for d in docs:
+            yield dict(d)
+
+    async def create_key(self, doc: dict[str, Any]) -> bool:
+        if doc["api_key"] in self.users:
+            return False
+        self.users[doc["api_key"]] = {"created_at": datetime.utcnow(), **doc}
+        return True
+
+    async def list_keys(self) -> list[dict[str, Any]]:
+        return [{k: d.get(k) for k in _KEY_FIELDS} for d in self.users.values()]
+
+    async def update_key(
+        self,
+        api_key: str,
+        balance_inc: Optional[int] = None,
+        status: Optional[str] = None,
+    ) -> tuple[int, int]:
+        doc = self.users.get(api_key)
+        if doc is None:
+            return 0, 0
+        modified = 0
+        if balance_inc:
+            doc["balance_tokens"] = (doc.get("balance_tokens") or 0) + balance_inc
+            modified = 1
+        if status is not None and doc.get("status") != status:
+            doc["status"] = status
+            modified = 1
+        return 1, modified
@@ -0,0 +1,122 @@
+# storage/mongo.py - MongoDB 存储后端（motor）
+
+from datetime import datetime
+from typing import Any, AsyncIterator, Optional
+
+from database import COLL_AUDIT_LOGS, COLL_USERS, get_db
+from storage.base import Storage
+from utils.logger import get_logger
+
+logger = get_logger("storage.mongo")
+
+_KEY_PROJECTION = {"_id": 0, "api_key": 1, "user_name": 1, "balance_tokens": 1, "status": 1, "created_at": 1}
+
+
+class MongoStorage(Storage):
+    """基于 database.get_db() 的实现，行为与拆分前的 services 一致。"""
+
+    name = "mongo"
+
+    async def connect(self) -> None:
+        """创建 motor 客户端并 ping，提前完成服务发现与连接建立；确保归档 / 导出所需索引。"""
+        db = get_db()
+        await db.command("ping")
+        await db[COLL_AUDIT_LOGS].create_index("timestamp")
+
+    async def get_active_user(self, api_key: str) -> Optional[dict[str, Any]]:
+        doc = await get_db()[COLL_USERS].find_one({"api_key": api_key, "status": "active"})
+        if not doc:
+            return None
+        doc.pop("_id", None)
+        return doc
+
+    async def get_balance(self, api_key: str) -> Optional[int]:
+        doc = await get_db()[COLL_USERS].find_one(
+            {"api_key": api_key, "status": "active"},
+            projection={"balance_tokens": 1},
+        )
+        if not doc:
+            return None
+        return doc.get("balance_tokens") or 0
+
+    async def deduct_tokens(self, api_key: str, tokens: int) -> bool:
+        db = get_db()
+        # 先 $inc 扣减，再检查结果；余额为负则加回（find_one_and_update 保证并发安全）
+        result = await db[COLL_USERS].find_one_and_update(
+            {"api_key": api_key, "status": "active"},
+            {"$inc": {"balance_tokens": -tokens}},
+            return_document=True,
+            projection={"balance_tokens": 1},
+        )
+        if not result:
+            return False
+        if result.get("balance_tokens", 0) < 0:
+            await db[COLL_USERS].update_one(
+                {"api_key": api_key},
+                {"$inc": {"balance_tokens": tokens}},
+            )
+            logger.warning("余额不足已回滚: api_key=%s, 尝试扣除=%s", api_key[:8] + "***", tokens)
+            return False
+        return True
+
+    async def add_tokens(self, api_key: str, tokens: int) -> bool:
+        result = await get_db()[COLL_USERS].update_one(
+            {"api_key": api_key},
+            {"$inc": {"balance_tokens": tokens}},
+        )
+        return result.matched_count > 0
+
+    async def append_audit(self, doc: dict[str, Any]) -> None:
+        await get_db()[COLL_AUDIT_LOGS].insert_one(dict(doc))
+
+    async def fetch_audit_before(self, cutoff: datetime, limit: int) -> list[dict[str, Any]]:
+        cursor = get_db()[COLL_AUDIT_LOGS].find({"timestamp": {"$lt": cutoff}}).sort("timestamp", 1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def delete_audit(self, ids: list[Any]) -> int:
+        if not ids:
+            return 0
+        from bson import ObjectId  # 随 motor 懒加载
+
+        # 归档文件中的 audit_id 为 ObjectId 的字符串形式
+        ids = [ObjectId(i) if isinstance(i, str) and ObjectId.is_valid(i) else i for i in ids]
+        result = await get_db()[COLL_AUDIT_LOGS].delete_many({"_id": {"$in": ids}})
+        return result.deleted_count
+
+    async def iter_audit(self, start: datetime, end: datetime, batch_size: int = 1000) -> AsyncIterator[dict[str, Any]]:
+        cursor = (
+            get_db()[COLL_AUDIT_LOGS]
+            .find({"timestamp": {"$gte": start, "$lt": end}})
+            .sort("timestamp", 1)
+            .batch_size(batch_size)
+        )
+        async for doc in cursor:
+            yield doc
+
+    async def create_key(self, doc: dict[str, Any]) -> bool:
+        coll = get_db()[COLL_USERS]
+        if await coll.find_one({"api_key": doc["api_key"]}):
+            return False
+        await coll.insert_one(dict(doc))
+        return True
+
+    async def list_keys(self) -> list[dict[str, Any]]:
+        keys = []
+        async for doc in get_db()[COLL_USERS].find({}, _KEY_PROJECTION):
+            keys.append(doc)
+        return keys
+
+    async def update_key(
+        self,
+        api_key: str,
+        balance_inc: Optional[int] = None,
+        status: Optional[str] = None,
+    ) -> tuple[int, int]:
+        update: dict = {}
+        if balance_inc is not None:
+            update["$inc"] = {"balance_tokens": balance_inc}
+        if status is not None:
+            update["$set"] = {"status": status}
+        # 合并 $inc 与 $set 到同一次 update
+        result = await get_db()[COLL_USERS].update_one({"api_key": api_key}, update)
+        return result.matched_count, result.modified_count
@@ -0,0 +1,338 @@
+# storage/sqlite.py - 嵌入式 SQLite 存储后端（WAL + 批量提交）
+
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Optional, TypeVar
+
+from storage.base import Storage
+from utils.logger import get_logger
+
+logger = get_logger("storage.sqlite")
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    api_key        TEXT PRIMARY KEY,
+    user_name      TEXT NOT NULL,
+    balance_tokens INTEGER NOT NULL DEFAULT 0,
+    status         TEXT NOT NULL DEFAULT 'active',
+    created_at     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audit_logs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp     TEXT NOT NULL,
+    user_id       TEXT,
+    api_key       TEXT NOT NULL,
+    model         TEXT,
+    input_tokens  INTEGER,
+    output_tokens INTEGER,
+    total_tokens  INTEGER,
+    duration_ms   REAL,
+    status_code   INTEGER,
+    extra         TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs (timestamp);
+"""
+
+_AUDIT_COLUMNS = (
+    "timestamp", "user_id", "api_key", "model", "input_tokens",
+    "output_tokens", "total_tokens", "duration_ms", "status_code",
+)
+
+
+def _to_text(v: Any) -> Any:
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+def _from_text(v: Any) -> Any:
+    if isinstance(v, str):
+        try:
+            return datetime.fromisoformat(v)
+        except ValueError:
+            return v
+    return v
+
+
+def _audit_row_to_doc(row: sqlite3.Row) -> dict[str, Any]:
+    doc = {c: row[c] for c in _AUDIT_COLUMNS}
+    doc["timestamp"] = _from_text(doc["timestamp"])
+    if row["extra"]:
+        doc.update(json.loads(row["extra"]))
+    return doc
+
+
+class SQLiteStorage(Storage):
+    """
+    单连接 + 单线程执行器：所有语句串行执行，扣减用条件 UPDATE 保证原子性。
+    写入不逐条 fsync：累计 commit_batch 条或距首条未提交写入超过 commit_interval_ms 时统一提交，
+    崩溃时最多丢失一个提交窗口内的写入。同一连接内的读能看到未提交的写，进程内一致；
+    多个 worker 共享同一文件时，其他进程在提交后才可见，建议单节点单进程部署。
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, commit_batch: int = 64, commit_interval_ms: int = 50) -> None:
+        self._path = path
+        self._commit_batch = max(1, commit_batch)
+        self._commit_interval = max(0, commit_interval_ms) / 1000
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-storage")
+        self._conn: sqlite3.Connection | None = None
+        self._pending = 0
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._flush_task: asyncio.Task | None = None  # 定时提交任务，持有引用以免被回收、close 时等待
+
+    # ---------- 执行器 ----------
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self._conn is None:
+            await self.connect()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def _write_sync(self, fn: Callable[[sqlite3.Connection], T]) -> tuple[T, bool]:
+        """执行写操作；达到批量阈值时立即提交。返回 (结果, 是否仍有未提交写入)。"""
+        result = fn(self._conn)
+        self._pending += 1
+        if self._pending >= self._commit_batch:
+            self._commit_sync()
+        return result, self._pending > 0
+
+    def _commit_sync(self) -> None:
+        if self._pending and self._conn is not None:
+            self._conn.commit()
+            self._pending = 0
+
+    async def _write(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        result, pending = await self._run(self._write_sync, fn)
+        if pending and self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self._commit_interval, self._schedule_flush)
+        return result
+
+    def _schedule_flush(self) -> None:
+        self._flush_handle = None
+        self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+        self._flush_task.add_done_callback(self._on_flush_done)
+
+    def _on_flush_done(self, task: asyncio.Task) -> None:
+        if self._flush_task is task:
+            self._flush_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("SQLite 定时提交失败，待下次写入重试: %r", task.exception())
+
+    async def flush(self) -> None:
+        """立即提交未落盘的写入。"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._conn is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._commit_sync)
+
+    # ---------- 生命周期 ----------
+
+    def _connect_sync(self) -> None:
+        if self._conn is not None:
+            return
+        if self._path != ":memory:":
+            Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self._path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.executescript(_SCHEMA)
+        conn.commit()
+        self._conn = conn
+        logger.info("SQLite 存储已打开: %s", self._path)
+
+    async def connect(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._connect_sync)
+
+    def _close_sync(self) -> None:
+        if self._conn is not None:
+            self._commit_sync()
+            self._conn.close()
+            self._conn = None
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            # 异常已由 done 回调记录，此处只等待其结束
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_sync)
+
+    # ---------- Key 查询 ----------
+
+    async def get_active_user(self, api_key: str) -> Optional[dict[str, Any]]:
+        def _q() -> Optional[dict[str, Any]]:
+            row = self._conn.execute(
+                "SELECT api_key, user_name, balance_tokens, status, created_at FROM users "
+                "WHERE api_key = ? AND status = 'active'",
+                (api_key,),
+            ).fetchone()
+            if row is None:
+                return None
+            doc = dict(row)
+            doc["created_at"] = _from_text(doc["created_at"])
+            return doc
+
+        return await self._run(_q)
+
+    async def get_balance(self, api_key: str) -> Optional[int]:
+        def _q() -> Optional[int]:
+            row = self._conn.execute(
+                "SELECT balance_tokens FROM users WHERE api_key = ? AND status = 'active'",
+                (api_key,),
+            ).fetchone()
+            return row[0] if row is not None else None
+
+        return await self._run(_q)
+
+    # ---------- 预留 / 扣减 ----------
+
+    async def deduct_tokens(self, api_key: str, tokens: int) -> bool:
+        def _w(conn: sqlite3.Connection) -> bool:
+            cur = conn.execute(
+                "UPDATE users SET balance_tokens = balance_tokens - ? "
+                "WHERE api_key = ? AND status = 'active' AND balance_tokens >= ?",
+                (tokens, api_key, tokens),
+            )
+            return cur.rowcount > 0
+
+        return await self._write(_w)
+
+    async def add_tokens(self, api_key: str, tokens: int) -> bool:
+        def _w(conn: sqlite3.Connection) -> bool:
+            cur = conn.execute(
+                "UPDATE users SET balance_tokens = balance_tokens + ? WHERE api_key = ?",
+                (tokens, api_key),
+            )
+            return cur.rowcount > 0
+
+        return await self._write(_w)
+
+    # ---------- 审计 ----------
+
+    async def append_audit(self, doc: dict[str, Any]) -> None:
+        values = [_to_text(doc.get(c)) for c in _AUDIT_COLUMNS]
+        extra = {k: _to_text(v) for k, v in doc.items() if k not in _AUDIT_COLUMNS and k != "_id"}
+        values.append(json.dumps(extra, ensure_ascii=False, default=str) if extra else None)
+
+        def _w(conn: sqlite3.Connection) -> None:
+            conn.execute(
+                f"INSERT INTO audit_logs ({', '.join(_AUDIT_COLUMNS)}, extra) "
+                f"VALUES ({', '.join('?' * (len(_AUDIT_COLUMNS) + 1))})",
+                values,
+            )
+
+        await self._write(_w)
+
+    async def fetch_audit_before(self, cutoff: datetime, limit: int) -> list[dict[str, Any]]:
+        def _q() -> list[dict[str, Any]]:
+            rows = self._conn.execute(
+                "SELECT * FROM audit_logs WHERE timestamp < ? ORDER BY timestamp, id LIMIT ?",
+                (_to_text(cutoff), limit),
+            ).fetchall()
+            return [{**_audit_row_to_doc(r), "_id": r["id"]} for r in rows]
+
+        return await self._run(_q)
+
+    async def delete_audit(self, ids: list[Any]) -> int:
+        if not ids:
+            return 0
+
+        def _w(conn: sqlite3.Connection) -> int:
+            deleted = 0
+            # 分段以避开 SQLite 的绑定参数上限
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                cur = conn.execute(
+                    f"DELETE FROM audit_logs WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                deleted += cur.rowcount
+            return deleted
+
+        return await self._write(_w)
+
+    async def iter_audit(self, start: datetime, end: datetime, batch_size: int = 1000) -> AsyncIterator[dict[str, Any]]:
+        # 按 (timestamp, id) 键集分页，不跨执行器调用持有游标
+        last_ts, last_id = _to_text(start), 0
+        end_ts = _to_text(end)
+        first = True
+        while True:
+            def _q(last_ts: str = last_ts, last_id: int = last_id, first: bool = first) -> list[sqlite3.Row]:
+                if first:
+                    return self._conn.execute(
+                        "SELECT * FROM audit_logs WHERE timestamp >= ? AND timestamp < ? "
+                        "ORDER BY timestamp, id LIMIT ?",
+                        (last_ts, end_ts, batch_size),
+                    ).fetchall()
+                return self._conn.execute(
+                    "SELECT * FROM audit_logs WHERE (timestamp > ? OR (timestamp = ? AND id > ?)) "
+                    "AND timestamp < ? ORDER BY timestamp, id LIMIT ?",
+                    (last_ts, last_ts, last_id, end_ts, batch_size),
+                ).fetchall()
+
+            rows = await self._run(_q)
+            for r in rows:
+                yield {**_audit_row_to_doc(r), "_id": r["id"]}
+            if len(rows) < batch_size:
+                return
+            last_ts, last_id, first = rows[-1]["timestamp"], rows[-1]["id"], False
+
+    # ---------- Key 管理 ----------
+
+    async def create_key(self, doc: dict[str, Any]) -> bool:
+        def _w(conn: sqlite3.Connection) -> bool:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO users (api_key, user_name, balance_tokens, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    doc["api_key"],
+                    doc["user_name"],
+                    doc.get("balance_tokens", 0),
+                    doc.get("status", "active"),
+                    _to_text(doc.get("created_at") or datetime.utcnow()),
+                ),
+            )
+            return cur.rowcount > 0
+
+        return await self._write(_w)
+
+    async def list_keys(self) -> list[dict[str, Any]]:
+        def _q() -> list[dict[str, Any]]:
+            rows = self._conn.execute(
+                "SELECT api_key, user_name, balance_tokens, status, created_at FROM users"
+            ).fetchall()
+            return [{**dict(r), "created_at": _from_text(r["created_at"])} for r in rows]
+
+        return await self._run(_q)
+
+    async def update_key(
+        self,
+        api_key: str,
+        balance_inc: Optional[int] = None,
+        status: Optional[str] = None,
+    ) -> tuple[int, int]:
+        def _w(conn: sqlite3.Connection) -> tuple[int, int]:
+            row = conn.execute("SELECT status FROM users WHERE api_key = ?", (api_key,)).fetchone()
+            if row is None:
+                return 0, 0
+            modified = 0
+            if balance_inc:
+                conn.execute(
+                    "UPDATE users SET balance_tokens = balance_tokens + ? WHERE api_key = ?",
+                    (balance_inc, api_key),
+                )
+                modified = 1
+            if status is not None and row["status"] != status:
+                conn.execute("UPDATE users SET status = ? WHERE api_key = ?", (status, api_key))
+                modified = 1
+            return 1, modified
+
+        return await self._write(_w)
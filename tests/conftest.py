@@ -0,0 +1,53 @@
+# tests/conftest.py - 公共 fixture：仓库根目录加入 sys.path，按后端参数化的存储
+
+import asyncio
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from storage import set_storage  # noqa: E402
+from storage.base import Storage  # noqa: E402
+from storage.memory import MemoryStorage  # noqa: E402
+from storage.sqlite import SQLiteStorage  # noqa: E402
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def run_with_storage(request, tmp_path) -> Callable[[Callable[[Storage], Awaitable[Any]]], Any]:
+    """
+    在新的事件循环中以指定后端执行 fn(storage)：连接、设为全局存储，结束后关闭。
+    SQLite 使用临时文件，每个用例独立。
+    """
+
+    def _run(fn: Callable[[Storage], Awaitable[Any]]) -> Any:
+        async def _main() -> Any:
+            storage = MemoryStorage() if request.param == "memory" else SQLiteStorage(str(tmp_path / "bridge.db"))
+            await storage.connect()
+            set_storage(storage)
+            try:
+                return await fn(storage)
+            finally:
+                await storage.close()
+
+        return asyncio.run(_main())
+
+    return _run
+
+
+async def create_key(storage: Storage, api_key: str, balance: int, status: str = "active") -> None:
+    await storage.create_key(
+        {
+            "api_key": api_key,
+            "user_name": "tester",
+            "balance_tokens": balance,
+            "status": status,
+            "created_at": datetime.utcnow(),
+        }
+    )
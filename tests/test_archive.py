@@ -0,0 +1,162 @@
+# tests/test_archive.py - 审计归档 → 导出往返、中断批次补完与后台归档状态
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import archive_service
+
+BASE = datetime(2026, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def archive_dir(tmp_path, monkeypatch):
+    path = tmp_path / "archive"
+    monkeypatch.setenv("AUDIT_ARCHIVE_DIR", str(path))
+    archive_service._runs.clear()
+    return path
+
+
+async def _seed(storage, n: int = 30, step_hours: int = 3) -> None:
+    for i in range(n):
+        await storage.append_audit(
+            {
+                "timestamp": BASE + timedelta(hours=i * step_hours),
+                "user_id": "tester",
+                "api_key": "sk-a***",
+                "model": "gpt-test",
+                "input_tokens": i,
+                "output_tokens": 1,
+                "total_tokens": i + 1,
+                "duration_ms": 1.0,
+                "status_code": 200,
+            }
+        )
+
+
+async def _export(start: datetime, end: datetime) -> list[dict]:
+    chunks = [c async for c in archive_service.export_audit_logs(start, end)]
+    return [json.loads(line) for line in b"".join(chunks).splitlines()]
+
+
+def test_archive_export_round_trip(run_with_storage, archive_dir):
+    async def body(storage):
+        await _seed(storage)
+        cutoff = BASE + timedelta(days=2)
+        result = await archive_service.archive_audit_logs(cutoff, batch_size=7)
+        assert result["status"] == "completed"
+        assert result["archived"] == 16
+
+        live = [d async for d in storage.iter_audit(BASE, BASE + timedelta(days=30))]
+        assert len(live) == 14
+        assert all(d["timestamp"] >= cutoff for d in live)
+
+        files = [e for e in archive_service.read_manifest() if e.get("kind") == "file"]
+        assert sum(e["count"] for e in files) == 16
+        assert {e["partition"] for e in files} == {"2026-01-01", "2026-01-02"}
+        assert all((archive_dir / e["path"]).exists() for e in files)
+
+        records = await _export(BASE, BASE + timedelta(days=30))
+        assert [r["input_tokens"] for r in records] == list(range(30))
+        assert len({r["audit_id"] for r in records}) == 30
+        assert datetime.fromisoformat(records[0]["timestamp"]) == BASE
+
+        window = await _export(BASE + timedelta(hours=36), BASE + timedelta(hours=60))
+        assert [r["input_tokens"] for r in window] == list(range(12, 20))
+
+    run_with_storage(body)
+
+
+def test_interrupted_batch_is_not_archived_twice(run_with_storage):
+    async def body(storage):
+        await _seed(storage)
+        cutoff = BASE + timedelta(days=2)
+        delete_audit = storage.delete_audit
+
+        async def crash(ids):
+            raise RuntimeError("crash between write and delete")
+
+        storage.delete_audit = crash
+        with pytest.raises(RuntimeError):
+            await archive_service.archive_audit_logs(cutoff, batch_size=5)
+        storage.delete_audit = delete_audit
+
+        # 文件已写入但删除未确认：导出不重复
+        records = await _export(BASE, BASE + timedelta(days=30))
+        assert len(records) == 30
+        assert len({r["audit_id"] for r in records}) == 30
+
+        result = await archive_service.archive_audit_logs(cutoff, batch_size=5)
+        assert result["archived"] == 11
+        assert archive_service._pending_files(archive_service.read_manifest()) == []
+        files = [e for e in archive_service.read_manifest() if e.get("kind") == "file"]
+        assert sum(e["count"] for e in files) == 16
+
+        records = await _export(BASE, BASE + timedelta(days=30))
+        assert [r["input_tokens"] for r in records] == list(range(30))
+
+    run_with_storage(body)
+
+
+def test_background_archive_reports_status(run_with_storage):
+    async def body(storage):
+        await _seed(storage)
+        run = archive_service.start_archive(BASE + timedelta(days=2))
+        assert run["status"] == "running"
+        with pytest.raises(archive_service.ArchiveBusyError):
+            archive_service.start_archive(BASE + timedelta(days=2))
+        await asyncio.gather(*archive_service._tasks)
+
+        status = archive_service.get_run(run["run_id"])
+        assert status["status"] == "completed"
+        assert status["archived"] == 16
+
+        # 进程重启后从 manifest 读取
+        archive_service._runs.clear()
+        assert archive_service.get_run(run["run_id"])["archived"] == 16
+        assert archive_service.get_run("missing") is None
+
+    run_with_storage(body)
+
+
+def test_export_reads_no_ids_when_nothing_is_pending(run_with_storage, monkeypatch):
+    async def body(storage):
+        await _seed(storage)
+        await archive_service.archive_audit_logs(BASE + timedelta(days=2), batch_size=7)
+        assert archive_service._pending_files(archive_service.read_manifest()) == []
+
+        calls = []
+        read_audit_ids = archive_service._read_audit_ids
+
+        def counting(path):
+            calls.append(path)
+            return read_audit_ids(path)
+
+        monkeypatch.setattr(archive_service, "_read_audit_ids", counting)
+        records = await _export(BASE, BASE + timedelta(days=30))
+        assert len(records) == 30
+        assert calls == []
+
+    run_with_storage(body)
+
+
+def test_archive_during_export_is_not_blocked_and_loses_nothing(run_with_storage, monkeypatch):
+    monkeypatch.setattr(archive_service, "_READ_LINES", 5)
+
+    async def body(storage):
+        await _seed(storage)
+        stream = archive_service.export_audit_logs(BASE, BASE + timedelta(days=30))
+        first = await stream.__anext__()
+
+        # 客户端暂停读取时导出不持锁，归档可以完成；被移走的记录由导出从新文件补出
+        result = await asyncio.wait_for(archive_service.archive_audit_logs(BASE + timedelta(days=2), batch_size=7), 5)
+        assert result["archived"] == 16
+
+        rest = [chunk async for chunk in stream]
+        records = [json.loads(line) for line in b"".join([first, *rest]).splitlines()]
+        assert sorted(r["input_tokens"] for r in records) == list(range(30))
+        assert len({r["audit_id"] for r in records}) == 30
+
+    run_with_storage(body)
@@ -0,0 +1,272 @@
+# tests/test_batch.py - 批处理：预留 / 结算后的余额、取消、跨进程取消与失联任务回收
+
+import asyncio
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+from models import BatchJob
+from services import batch_service, proxy_service
+from tests.conftest import create_key
+
+API_KEY = "sk-batch"
+INITIAL = 10_000
+INPUT_TOKENS, OUTPUT_TOKENS = 10, 5
+
+
+class StubUpstream:
+    """替代 proxy_service.stream_completion：前 free 次调用立即返回，其余等待 gate。"""
+
+    def __init__(self, free: int | None = None) -> None:
+        self.free = free
+        self.calls = 0
+        self.gate = asyncio.Event()
+
+    async def __call__(self, messages, model=None, stream=True, **kwargs):
+        self.calls += 1
+        if self.free is not None and self.calls > self.free:
+            await self.gate.wait()
+        yield {"id": "chatcmpl-stub", "choices": [{"index": 0, "delta": {"content": "ok"}}]}
+        yield {
+            "id": "chatcmpl-stub",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": INPUT_TOKENS, "completion_tokens": OUTPUT_TOKENS},
+        }
+
+
+@pytest.fixture(autouse=True)
+def batch_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("BATCH_DIR", str(tmp_path / "batches"))
+    monkeypatch.setenv("BATCH_CONCURRENCY", "2")
+    # tiktoken 编码文件可能无法下载，输入估算固定为 7
+    monkeypatch.setattr(batch_service, "count_tokens_sync", lambda messages, encoding: 7)
+    monkeypatch.setattr(batch_service, "_semaphore", None)
+    batch_service._jobs.clear()
+    batch_service._tasks.clear()
+    batch_service._reclaimed.clear()
+
+
+def _lines(n: int, **body) -> list[dict]:
+    return [
+        {
+            "custom_id": f"req-{i}",
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {"model": "gpt-test", "messages": [{"role": "user", "content": f"hi {i}"}], "max_tokens": 20, **body},
+        }
+        for i in range(n)
+    ]
+
+
+async def _submit(lines: list[dict]) -> tuple[BatchJob, asyncio.Task]:
+    payload = "".join(json.dumps(line) + "\n" for line in lines).encode()
+
+    async def chunks():
+        yield payload
+
+    f = await batch_service.save_upload(chunks(), "input.jsonl", "batch", API_KEY)
+    job = await batch_service.create_batch(f.id, "/v1/chat/completions", "24h", None, API_KEY, "tester")
+    return job, batch_service._tasks[job.id]
+
+
+async def _wait_for(cond, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+async def _audit_docs(storage) -> list[dict]:
+    return [d async for d in storage.iter_audit(datetime(2000, 1, 1), datetime(2100, 1, 1))]
+
+
+def test_batch_completes_and_refunds_unused_reservation(run_with_storage, monkeypatch):
+    upstream = StubUpstream()
+    monkeypatch.setattr(proxy_service, "stream_completion", upstream)
+
+    async def body(storage):
+        await create_key(storage, API_KEY, INITIAL)
+        job, task = await _submit(_lines(20))
+        await asyncio.wait_for(task, 5)
+
+        job = await batch_service.get_batch(job.id, API_KEY)
+        assert job.status == "completed"
+        assert job.request_counts == {"total": 20, "completed": 20, "failed": 0}
+        assert job.used_tokens == 20 * (INPUT_TOKENS + OUTPUT_TOKENS)
+        assert job.reserved_tokens == job.used_tokens
+        assert await storage.get_balance(API_KEY) == INITIAL - job.used_tokens
+
+        output = batch_service.file_path(job.output_file_id).read_text().splitlines()
+        assert sorted(json.loads(line)["custom_id"] for line in output) == sorted(f"req-{i}" for i in range(20))
+        assert job.error_file_id is None
+
+        audits = await _audit_docs(storage)
+        assert len(audits) == 1
+        assert audits[0]["batch_id"] == job.id
+        assert audits[0]["request_count"] == 20
+        assert audits[0]["total_tokens"] == job.used_tokens
+
+    run_with_storage(body)
+
+
+def test_cancel_keeps_completed_items_and_refunds_rest(run_with_storage, monkeypatch):
+    upstream = StubUpstream(free=5)
+    monkeypatch.setattr(proxy_service, "stream_completion", upstream)
+
+    async def body(storage):
+        await create_key(storage, API_KEY, INITIAL)
+        job, task = await _submit(_lines(50))
+        await _wait_for(lambda: job.request_counts["completed"] >= 5 and upstream.calls >= 7)
+        # 一次性预留：每条输入估算 7 + max_tokens 20
+        assert await storage.get_balance(API_KEY) == INITIAL - 50 * (7 + 20)
+
+        cancelled = await batch_service.cancel_batch(job.id, API_KEY)
+        assert cancelled.status == "cancelling"
+        upstream.gate.set()
+        await asyncio.wait_for(task, 5)
+
+        job = await batch_service.get_batch(job.id, API_KEY)
+        assert job.status == "cancelled"
+        assert 5 <= job.request_counts["completed"] < 50
+        assert job.used_tokens == job.request_counts["completed"] * (INPUT_TOKENS + OUTPUT_TOKENS)
+        assert await storage.get_balance(API_KEY) == INITIAL - job.used_tokens
+
+    run_with_storage(body)
+
+
+def test_cancel_marker_from_other_worker_is_applied_on_heartbeat(run_with_storage, monkeypatch):
+    upstream = StubUpstream(free=0)
+    monkeypatch.setattr(proxy_service, "stream_completion", upstream)
+
+    async def body(storage):
+        await create_key(storage, API_KEY, INITIAL)
+        job, task = await _submit(_lines(10))
+        await _wait_for(lambda: upstream.calls >= 2)
+
+        # 其他 worker 收到取消请求时只能写入标记
+        assert batch_service._create_marker(batch_service._marker_path(job.id, "cancel"))
+        await batch_service._heartbeat()
+        assert job.status == "cancelling"
+
+        upstream.gate.set()
+        await asyncio.wait_for(task, 5)
+        job = await batch_service.get_batch(job.id, API_KEY)
+        assert job.status == "cancelled"
+        assert await storage.get_balance(API_KEY) == INITIAL - job.used_tokens
+
+    run_with_storage(body)
+
+
+def test_recover_only_reclaims_jobs_with_stale_heartbeat(run_with_storage):
+    async def body(storage):
+        await create_key(storage, API_KEY, INITIAL - 500 - 500)
+        now = int(time.time())
+        common = dict(
+            input_file_id="file-x",
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            created_at=now,
+            status="in_progress",
+            api_key=API_KEY,
+            reserved_tokens=500,
+            used_tokens=120,
+        )
+        stale = BatchJob(id="batch_stale", owner="host-a:1:dead", heartbeat_at=now - 3600, **common)
+        alive = BatchJob(id="batch_alive", owner="host-b:2:beef", heartbeat_at=now, **common)
+        await batch_service._save(stale)
+        await batch_service._save(alive)
+
+        assert await batch_service.recover_interrupted() == 1
+        assert await batch_service.recover_interrupted() == 0
+        assert await storage.get_balance(API_KEY) == INITIAL - 500 - 500 + 380
+
+        stale = await batch_service.get_batch("batch_stale", API_KEY)
+        assert stale.status == "failed"
+        assert stale.reserved_tokens == stale.used_tokens == 120
+        assert (await batch_service.get_batch("batch_alive", API_KEY)).status == "in_progress"
+
+        # 非属主 worker 上的取消：写入标记，对外显示 cancelling
+        cancelled = await batch_service.cancel_batch("batch_alive", API_KEY)
+        assert cancelled.status == "cancelling"
+        assert (await batch_service.get_batch("batch_alive", API_KEY)).status == "cancelling"
+
+    run_with_storage(body)
+
+
+def test_invalid_max_tokens_fails_validation_without_charging(run_with_storage, monkeypatch):
+    upstream = StubUpstream()
+    monkeypatch.setattr(proxy_service, "stream_completion", upstream)
+
+    async def body(storage):
+        await create_key(storage, API_KEY, INITIAL)
+        lines = _lines(3)
+        lines[1]["body"]["max_tokens"] = "abc"
+        job, task = await _submit(lines)
+        await asyncio.wait_for(task, 5)
+
+        job = await batch_service.get_batch(job.id, API_KEY)
+        assert job.status == "failed"
+        assert [e["line"] for e in job.errors["data"]] == [2]
+        assert upstream.calls == 0
+        assert await storage.get_balance(API_KEY) == INITIAL
+
+    run_with_storage(body)
+
+
+def test_concurrent_saves_of_same_job_do_not_collide():
+    async def main():
+        job = BatchJob(
+            id="batch_concurrent",
+            input_file_id="file-x",
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+            created_at=int(time.time()),
+            api_key=API_KEY,
+            owner=batch_service.INSTANCE_ID,
+        )
+        for i in range(200):
+            job.used_tokens = i
+            await asyncio.gather(*(batch_service._save(job) for _ in range(4)))
+        # 绕过进程内串行化，直接并发写同一路径（模拟多个进程）
+        path = batch_service._meta_path("batches", job.id)
+        await asyncio.gather(
+            *(asyncio.to_thread(batch_service._write_meta, path, job.model_dump_json()) for _ in range(8))
+        )
+
+        assert (await batch_service._load_batch(job.id)).used_tokens == 199
+        assert [p.name for p in path.parent.iterdir()] == [path.name]
+
+    asyncio.run(main())
+
+
+def test_cancel_during_reservation_refunds_and_skips_upstream(run_with_storage, monkeypatch):
+    upstream = StubUpstream()
+    monkeypatch.setattr(proxy_service, "stream_completion", upstream)
+
+    async def body(storage):
+        await create_key(storage, API_KEY, INITIAL)
+        reserving = asyncio.Event()
+        release = asyncio.Event()
+        deduct_tokens = storage.deduct_tokens
+
+        async def slow_deduct(api_key, tokens):
+            reserving.set()
+            await release.wait()
+            return await deduct_tokens(api_key, tokens)
+
+        monkeypatch.setattr(storage, "deduct_tokens", slow_deduct)
+        job, task = await _submit(_lines(50))
+        await asyncio.wait_for(reserving.wait(), 5)
+        assert (await batch_service.cancel_batch(job.id, API_KEY)).status == "cancelling"
+        release.set()
+        await asyncio.wait_for(task, 5)
+
+        job = await batch_service.get_batch(job.id, API_KEY)
+        assert job.status == "cancelled"
+        assert upstream.calls == 0
+        assert job.used_tokens == job.reserved_tokens == 0
+        assert await storage.get_balance(API_KEY) == INITIAL
+
+    run_with_storage(body)
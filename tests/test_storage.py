@@ -0,0 +1,98 @@
+# tests/test_storage.py - 存储后端一致性：扣费原子性与 Key 更新计数
+
+import asyncio
+import sqlite3
+
+from storage import sqlite as sqlite_storage
+from storage.sqlite import SQLiteStorage
+from tests.conftest import create_key
+
+
+def test_deduct_tokens_refuses_overdraft(run_with_storage):
+    async def body(storage):
+        await create_key(storage, "sk-a", 100)
+        assert await storage.deduct_tokens("sk-a", 150) is False
+        assert await storage.get_balance("sk-a") == 100
+        assert await storage.deduct_tokens("sk-a", 100) is True
+        assert await storage.get_balance("sk-a") == 0
+        assert await storage.deduct_tokens("sk-a", 1) is False
+        assert await storage.get_balance("sk-a") == 0
+
+    run_with_storage(body)
+
+
+def test_deduct_tokens_refuses_disabled_key(run_with_storage):
+    async def body(storage):
+        await create_key(storage, "sk-a", 100, status="disabled")
+        assert await storage.deduct_tokens("sk-a", 10) is False
+        assert await storage.deduct_tokens("sk-missing", 10) is False
+
+    run_with_storage(body)
+
+
+def test_update_key_matched_modified(run_with_storage):
+    async def body(storage):
+        await create_key(storage, "sk-a", 100)
+        assert await storage.update_key("sk-missing", 10, None) == (0, 0)
+        assert await storage.update_key("sk-a", 50, None) == (1, 1)
+        assert await storage.get_balance("sk-a") == 150
+        assert await storage.update_key("sk-a", None, "active") == (1, 0)
+        assert await storage.update_key("sk-a", None, "disabled") == (1, 1)
+        assert await storage.get_active_user("sk-a") is None
+        assert await storage.update_key("sk-a", 0, None) == (1, 0)
+
+    run_with_storage(body)
+
+
+def test_create_key_rejects_duplicate(run_with_storage):
+    async def body(storage):
+        await create_key(storage, "sk-a", 100)
+        assert await storage.create_key(
+            {"api_key": "sk-a", "user_name": "x", "balance_tokens": 1, "status": "active", "created_at": "2026-01-01"}
+        ) is False
+        keys = await storage.list_keys()
+        assert [k["api_key"] for k in keys] == ["sk-a"]
+        assert keys[0]["balance_tokens"] == 100
+
+    run_with_storage(body)
+
+
+def test_sqlite_timed_flush_failure_is_logged_and_close_commits(tmp_path, monkeypatch):
+    errors = []
+    monkeypatch.setattr(sqlite_storage.logger, "error", lambda msg, *args: errors.append(msg % args))
+    path = str(tmp_path / "bridge.db")
+
+    async def main():
+        storage = SQLiteStorage(path, commit_batch=100, commit_interval_ms=10)
+        await storage.connect()
+        await create_key(storage, "sk-a", 100)
+        await storage.flush()
+
+        commit = storage._commit_sync
+        failures = []
+
+        def failing_once():
+            if not failures:
+                failures.append(1)
+                raise sqlite3.OperationalError("disk I/O error")
+            commit()
+
+        monkeypatch.setattr(storage, "_commit_sync", failing_once)
+        assert await storage.deduct_tokens("sk-a", 10) is True
+        assert storage._flush_handle is not None
+        await asyncio.sleep(0.1)
+        assert failures and storage._flush_task is None
+        await storage.close()
+
+    asyncio.run(main())
+    assert len(errors) == 1 and "disk I/O error" in errors[0]
+
+    async def reopen():
+        storage = SQLiteStorage(path)
+        await storage.connect()
+        try:
+            return await storage.get_balance("sk-a")
+        finally:
+            await storage.close()
+
+    assert asyncio.run(reopen()) == 90
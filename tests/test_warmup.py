@@ -0,0 +1,31 @@
+# tests/test_warmup.py - 预热步骤顺序：模块导入不在多个线程并发进行
+
+import asyncio
+import time
+
+from services import proxy_service, warmup_service
+
+
+def test_encoder_waits_for_litellm_import(monkeypatch):
+    events = []
+
+    def slow_import():
+        events.append("litellm:start")
+        time.sleep(0.2)
+        events.append("litellm:done")
+        return object()
+
+    async def warmup_encoding(name):
+        events.append("encoder")
+
+    monkeypatch.setattr(proxy_service, "_litellm", None)
+    monkeypatch.setattr(proxy_service, "_litellm_import", None)
+    monkeypatch.setattr(proxy_service, "_import_litellm", slow_import)
+    monkeypatch.setattr(warmup_service, "warmup_encoding", warmup_encoding)
+
+    async def main():
+        # litellm 步骤与编码步骤并发启动，只应有一次导入，且编码加载在导入完成之后
+        await asyncio.gather(proxy_service.warmup_litellm(), warmup_service._warmup_encoder())
+
+    asyncio.run(main())
+    assert events == ["litellm:start", "litellm:done", "encoder"]
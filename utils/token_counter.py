@@ -1,23 +1,26 @@
 # utils/token_counter.py - 基于 tiktoken 的异步 Token 计数
 
 import asyncio
-from typing import Any
-
-import tiktoken
+from typing import TYPE_CHECKING, Any
 
 from utils.logger import get_logger
 
+if TYPE_CHECKING:
+    import tiktoken
+
 logger = get_logger("token_counter")
 
 # 默认编码，与 GPT 系列兼容
 _DEFAULT_ENCODING = "cl100k_base"
-_encoding: tiktoken.Encoding | None = None
+_encoding: "tiktoken.Encoding | None" = None
 
 
-def _get_encoding(encoding_name: str = _DEFAULT_ENCODING) -> tiktoken.Encoding:
-    """懒加载 tiktoken 编码（同步）。"""
+def _get_encoding(encoding_name: str = _DEFAULT_ENCODING) -> "tiktoken.Encoding":
+    """懒加载 tiktoken 及编码（同步）。"""
     global _encoding
     if _encoding is None:
+        import tiktoken
+
         try:
             _encoding = tiktoken.get_encoding(encoding_name)
         except Exception as e:
@@ -26,6 +29,11 @@ def _get_encoding(encoding_name: str = _DEFAULT_ENCODING) -> tiktoken.Encoding:
     return _encoding
 
 
+async def warmup_encoding(encoding_name: str = _DEFAULT_ENCODING) -> None:
+    """在线程池中加载编码（可能需下载 BPE 文件），供启动预热使用。"""
+    await asyncio.get_running_loop().run_in_executor(None, _get_encoding, encoding_name)
+
+
 def count_tokens_sync(messages: list[dict[str, Any]], encoding_name: str = _DEFAULT_ENCODING) -> int:
     """
     根据 OpenAI 规则估算 messages 的 token 数（同步）。